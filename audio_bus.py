@@ -0,0 +1,117 @@
+""" A single long lived microphone stream shared by everything that needs audio.
+    Captured frames go into one ring buffer and every subscriber (the wake word
+    engine and its command capture) reads from it at its own position, so the
+    input device only has to be opened once """
+
+import threading
+import numpy as np
+import sounddevice as sd
+
+
+def supports_rate(rate, channels=1):
+    """whether the default input device can record at the given sample rate"""
+    try:
+        sd.check_input_settings(channels=channels, samplerate=rate)
+    except Exception:
+        return False
+    return True
+
+
+class AudioBus:
+    """Owns the input stream and the ring buffer of the last `capacity` seconds of
+    (first channel) audio"""
+
+    def __init__(self, rate=16000, channels=1, block_duration=0.1, capacity=10.0):
+        self.rate = rate
+        self.channels = channels
+        self.blocksize = int(rate * block_duration)
+        self.ring = np.zeros(int(rate * capacity), dtype=np.float32)
+
+        # total number of samples ever written, positions are counted the same way
+        self.written = 0
+        self.overflows = 0
+        self.cond = threading.Condition()
+        self.stream = None
+
+    def start(self):
+        """opens the input stream, does nothing if it is already open"""
+        if self.stream is None:
+            self.stream = sd.InputStream(channels=self.channels,
+                                         samplerate=self.rate,
+                                         blocksize=self.blocksize,
+                                         callback=self.callback)
+            self.stream.start()
+
+    def stop(self):
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+
+    def callback(self, indata, frames, time, status):
+        """Callback method for the input stream, copies the recording into the ring"""
+        if status:
+            self.overflows += 1
+            print('Error:', status)
+
+        samples = indata[-len(self.ring):, 0]
+        n = len(samples)
+        with self.cond:
+            start = (self.written + len(indata) - n) % len(self.ring)
+            first = min(n, len(self.ring) - start)
+            self.ring[start:start + first] = samples[:first]
+            self.ring[:n - first] = samples[first:]
+            self.written += len(indata)
+            self.cond.notify_all()
+
+    def subscribe(self, max_lag=None, rewind=0):
+        """returns a Subscription that starts reading `rewind` samples before now"""
+        with self.cond:
+            position = max(self.written - rewind, self.written - len(self.ring), 0)
+            return Subscription(self, position, max_lag)
+
+
+class Subscription:
+    """One reader of an AudioBus. When the reader falls more than max_lag samples
+    behind the stream, the oldest unread audio is dropped"""
+
+    def __init__(self, bus, position, max_lag=None):
+        self.bus = bus
+        self.position = position
+        self.max_lag = min(max_lag or len(bus.ring), len(bus.ring))
+        self.dropped = 0
+        self.closed = False
+
+    @property
+    def available(self):
+        """number of samples that can be read without waiting"""
+        return self.bus.written - self.position
+
+    def close(self):
+        """stops the subscription, wakes up a reader that is waiting"""
+        with self.bus.cond:
+            self.closed = True
+            self.bus.cond.notify_all()
+
+    def read(self, n, timeout=None):
+        """waits for and returns the next n samples, or None if the subscription was
+        closed or the timeout ran out"""
+        bus = self.bus
+        with bus.cond:
+            ready = bus.cond.wait_for(lambda: self.closed or self.available >= n, timeout)
+            if self.closed or not ready:
+                return None
+
+            # drop the oldest audio until the lag is acceptable
+            skip = self.available - max(self.max_lag, n)
+            if skip > 0:
+                self.position += skip
+                self.dropped += skip
+
+            start = self.position % len(bus.ring)
+            first = min(n, len(bus.ring) - start)
+            out = np.empty(n, dtype=np.float32)
+            out[:first] = bus.ring[start:start + first]
+            out[first:] = bus.ring[:n - first]
+            self.position += n
+            return out
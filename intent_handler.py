@@ -2,19 +2,23 @@
 from utils.padaos import IntentContainer
 from skills.spelling import SpellingSkill
 from skills.timer import AlarmSkill
+from skills.countdown import TimerSkill
 
 class IntentHandler:
     """Willow's intent handler, contains methods that properly responds to 
     user utterance based on the intent behind it"""
 
-    def __init__(self):
+    def __init__(self, wake=None):
+        """wake is called from another thread when a timer goes off, to wake up the main loop"""
+
         # this container holds all special intents that the NLP model wasn't trained on
         self.container = IntentContainer()
 
         # special intents
         # each special skill must have methods to add their sub-intents to container defined above
         spelling = SpellingSkill()
-        self.special_skills = {'spelling' : spelling}
+        timer = TimerSkill(on_finish=wake)
+        self.special_skills = {'spelling' : spelling, 'timer': timer}
 
         # regular skills
         alarm = AlarmSkill()
@@ -34,6 +38,9 @@ class IntentHandler:
         if name == None:
             return (False, '')
         
+        # padaos only keeps one word of an entity at the end of the utterance, so skills
+        # get the whole utterance as well
+        data['utterance'] = utr
         response = self.special_skills[name.split('_')[0]].handle_intent(data)
         return (True, response)
     
@@ -47,8 +54,15 @@ class IntentHandler:
         elif intent_index == 2:
             self.reg_skills['alarm'].alarm_set(utr)
     
+    def next_alarm(self):
+        """returns the time the next alarm goes off, None if there are no alarms"""
+        return self.reg_skills['alarm'].next_due()
+
     def check_for_alarm(self):
-        """returns true if an alarm is going off rn"""
+        """returns true if an alarm or a timer is going off rn"""
+        if self.special_skills['timer'].announce_finished():
+            return True
+
         bru = self.reg_skills['alarm'].check_for_alarm()
 
         if bru:
@@ -0,0 +1,159 @@
+""" SQLite persistence for the alarm list. Saving hands the alarms added and removed
+    since the last save to a writer thread, which waits a moment so bursts of
+    changes become one write and then inserts and deletes those rows in a single
+    transaction.
+    The database runs in WAL mode, so a power cut loses at most the last write
+    instead of the whole list. The first time it is opened, alarms are migrated
+    from the old pickled list in things/alarms.pkl """
+
+import atexit
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime
+
+
+def to_row(alarm):
+    """(ring time, recurring days, until date) as strings the database stores"""
+    recur = ''.join(sorted(alarm[1])) if alarm[1] else None
+    until = alarm[2].isoformat() if len(alarm) > 2 and alarm[2] else None
+    return (alarm[0].isoformat(), recur, until)
+
+
+def from_row(row):
+    ring_at, recur, until = row
+    if recur is None:
+        return (datetime.fromisoformat(ring_at), None)
+    return (datetime.fromisoformat(ring_at), set(recur), date.fromisoformat(until) if until else None)
+
+
+class AlarmDatabase:
+    """Loads and saves the alarm list, writes happen on a background thread"""
+
+    def __init__(self, path='things/alarms.db', legacy_path='things/alarms.pkl', delay=0.5, compact_every=50,
+                 max_attempts=5):
+        self.path = path
+        self.legacy_path = legacy_path
+        self.delay = delay
+        self.compact_every = compact_every
+        # a write that keeps failing (locked or read-only file, full disk) is retried with a
+        # doubling wait, after max_attempts or once the database is closed its rows are dropped
+        self.max_attempts = max_attempts
+        self.failures = 0
+
+        self.cond = threading.Condition()
+        self.pending = Counter()    # row -> times it still has to be inserted (or deleted if < 0)
+        self.closed = False
+        self.transactions = 0
+        self.writer = None
+
+    def connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def load(self):
+        """returns the saved alarm list and starts the writer"""
+        conn = self.connect()
+        with conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS alarms (ring_at TEXT NOT NULL, recur TEXT, until TEXT)')
+            if conn.execute('PRAGMA user_version').fetchone()[0] == 0:
+                self.migrate(conn)
+                conn.execute('PRAGMA user_version = 1')
+
+        rows = conn.execute('SELECT ring_at, recur, until FROM alarms').fetchall()
+        conn.close()
+
+        self.writer = threading.Thread(target=self.run, daemon=True)
+        self.writer.start()
+        atexit.register(self.close)
+        return [from_row(row) for row in rows]
+
+    def migrate(self, conn):
+        """copies the pickled alarm list into the database, the pickle is left as it is"""
+        if not os.path.exists(self.legacy_path):
+            return
+        with open(self.legacy_path, 'rb') as f:
+            alarms = pickle.load(f)
+        conn.executemany('INSERT INTO alarms VALUES (?, ?, ?)', [to_row(alarm) for alarm in alarms])
+        print('[INFO] migrated', len(alarms), 'alarms from', self.legacy_path, 'to', self.path)
+
+    def save(self, added=(), removed=()):
+        """queues alarms to be inserted and deleted, returns immediately"""
+        if not added and not removed:
+            return
+        changes = Counter(to_row(alarm) for alarm in added)
+        changes.subtract(to_row(alarm) for alarm in removed)
+        with self.cond:
+            self.queue(changes)
+            self.cond.notify_all()
+
+    def queue(self, changes):
+        """adds row counts to the pending ones, an insert and a delete of a row cancel out"""
+        for row, n in changes.items():
+            self.pending[row] += n
+            if not self.pending[row]:
+                del self.pending[row]
+
+    def close(self):
+        if self.writer is None:
+            return
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        self.writer.join()
+        self.writer = None
+
+    def run(self):
+        """writer thread"""
+        conn = self.connect()
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.pending or self.closed)
+                if not self.pending:
+                    break
+
+                # let a burst of saves settle into one write. Every save wakes the
+                # thread up, so wait until the deadline rather than for one notify
+                wait = self.delay * 2 ** self.failures
+                deadline = time.monotonic() + wait
+                remaining = wait
+                while remaining > 0 and not self.closed:
+                    self.cond.wait(remaining)
+                    remaining = deadline - time.monotonic()
+                changes = self.pending
+                self.pending = Counter()
+
+            try:
+                self.write(conn, changes)
+                self.failures = 0
+            except sqlite3.Error as e:
+                # the transaction was rolled back, retry these changes after a longer wait
+                self.failures += 1
+                with self.cond:
+                    if self.closed or self.failures >= self.max_attempts:
+                        print('[WARNING] could not save alarms, dropped', sum(map(abs, changes.values())),
+                              'changed rows after', self.failures, 'attempts:', e)
+                        self.failures = 0
+                    else:
+                        print('[WARNING] could not save alarms, retrying:', e)
+                        self.queue(changes)
+        conn.close()
+
+    def write(self, conn, changes):
+        """inserts and deletes the changed rows in one transaction"""
+        with conn:
+            for row, n in changes.items():
+                if n < 0:
+                    conn.execute('DELETE FROM alarms WHERE rowid IN (SELECT rowid FROM alarms '
+                                 'WHERE ring_at = ? AND recur IS ? AND until IS ? LIMIT ?)', row + (-n,))
+            conn.executemany('INSERT INTO alarms VALUES (?, ?, ?)', (+changes).elements())
+
+        # fold the write ahead log back into the database now and then so it stays small
+        self.transactions += 1
+        if self.transactions % self.compact_every == 0:
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
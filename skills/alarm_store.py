@@ -0,0 +1,111 @@
+import heapq
+from itertools import count
+
+
+class AlarmStore:
+    """Holds the alarm list of AlarmSkill. Alarms are the same tuples as before
+    (time alarm should ring next, recurring days or None[, expiration date]).
+
+    A min-heap keyed on the ring time gives the next due alarm and O(log n) insert
+    and pop, and an index from time of day to alarms finds alarms for queries and
+    removal without scanning the list. Removed alarms stay in the heap and are
+    skipped once they reach the top. Alarms added and removed since the last
+    take_changes are kept, so only those have to be saved"""
+
+    def __init__(self, alarms=()):
+        self.heap = []          # [ring time, id, alarm]
+        self.alarms = {}        # id -> alarm, live alarms only
+        self.by_time = {}       # time of day -> {id: alarm}
+        self.ids = count()
+        self.added = []         # changes since the last take_changes
+        self.removed = []
+        for alarm in alarms:
+            self.add(alarm)
+        self.take_changes()
+
+    def __len__(self):
+        return len(self.alarms)
+
+    def __iter__(self):
+        """alarms in the order they ring"""
+        return iter(self.to_list())
+
+    def to_list(self):
+        """sorted list of alarms, the format saved to disk"""
+        return [alarm for _, alarm in sorted(self.alarms.items(), key=lambda e: (e[1][0], e[0]))]
+
+    def add(self, alarm):
+        alarm_id = next(self.ids)
+        heapq.heappush(self.heap, (alarm[0], alarm_id, alarm))
+        self.alarms[alarm_id] = alarm
+        self.by_time.setdefault(alarm[0].time(), {})[alarm_id] = alarm
+        self.added.append(alarm)
+
+    def remove(self, alarm):
+        """removes one alarm equal to the given one, returns whether there was one"""
+        same_time = self.by_time.get(alarm[0].time(), {})
+        for alarm_id, other in same_time.items():
+            if other == alarm:
+                self._discard(alarm_id)
+                return True
+        return False
+
+    def clear(self):
+        self.removed.extend(self.alarms.values())
+        self.heap = []
+        self.alarms = {}
+        self.by_time = {}
+
+    def take_changes(self):
+        """(alarms added, alarms removed) since the last call"""
+        changes = (self.added, self.removed)
+        self.added = []
+        self.removed = []
+        return changes
+
+    def find(self, dt):
+        """the alarm ringing exactly at dt, or None"""
+        for alarm in self.at_time(dt.time()):
+            if alarm[0] == dt:
+                return alarm
+        return None
+
+    def at_time(self, time_of_day):
+        """alarms ringing at the given time of day, in the order they ring"""
+        return sorted(self.by_time.get(time_of_day, {}).values(), key=lambda a: a[0])
+
+    def peek(self):
+        """the alarm that rings next, or None"""
+        self._drop_removed()
+        return self.heap[0][2] if self.heap else None
+
+    def next_due(self):
+        """the time the next alarm rings, or None if there are no alarms"""
+        alarm = self.peek()
+        return alarm[0] if alarm else None
+
+    def pop_due(self, now):
+        """removes and returns every alarm that should have rung before now"""
+        due = []
+        while self.peek() and self.heap[0][0] < now:
+            _, alarm_id, alarm = self.heap[0]
+            self._discard(alarm_id)
+            due.append(alarm)
+        return due
+
+    def _discard(self, alarm_id):
+        alarm = self.alarms.pop(alarm_id)
+        self.removed.append(alarm)
+        same_time = self.by_time[alarm[0].time()]
+        del same_time[alarm_id]
+        if not same_time:
+            del self.by_time[alarm[0].time()]
+
+        # rebuild once removed alarms make up most of the heap
+        if len(self.heap) > 2 * len(self.alarms) + 16:
+            self.heap = [(a[0], i, a) for i, a in self.alarms.items()]
+            heapq.heapify(self.heap)
+
+    def _drop_removed(self):
+        while self.heap and self.heap[0][1] not in self.alarms:
+            heapq.heappop(self.heap)
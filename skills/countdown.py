@@ -0,0 +1,187 @@
+import threading
+import time
+from speech_util import speak
+from utils.duration_parser import parse_duration
+from utils.timing_wheel import TimingWheel
+
+
+def describe(seconds, plural=True):
+    """spoken form of a duration, e.g. 1 hour and 30 minutes"""
+    seconds = max(int(round(seconds)), 1)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    parts = []
+    for amount, unit in ((hours, 'hour'), (minutes, 'minute'), (seconds, 'second')):
+        if amount:
+            parts.append(str(amount) + ' ' + unit + ('s' if plural and amount != 1 else ''))
+    if len(parts) == 1:
+        return parts[0]
+    return ', '.join(parts[:-1]) + ' and ' + parts[-1]
+
+
+class Countdown:
+    """A running or paused timer"""
+
+    def __init__(self, name, duration):
+        self.name = name
+        self.duration = duration
+        self.remaining = duration   # seconds left when it was last paused
+        self.deadline = None        # time.monotonic() it goes off at, None while paused
+        self.handle = None          # its timer on the timing wheel
+
+    def left(self):
+        if self.deadline is None:
+            return self.remaining
+        return max(self.deadline - time.monotonic(), 0)
+
+
+class TimerSkill:
+    """Willow's countdown timer skill. The intent model was not trained on timers, so its
+    intents are special intents. Timers run on a timing wheel, when one goes off it is
+    queued for announce_finished and on_finish is called to wake up the main loop"""
+
+    def __init__(self, on_finish=None):
+        self.on_finish = on_finish
+        self.wheel = TimingWheel()
+        self.timers = {}        # name -> Countdown
+        self.finished = []      # names of timers that went off and have not been announced
+        self.lock = threading.Lock()
+
+    def add_intents(self, container):
+        container.add_intent('timer_set', [
+            '(set|start) (a|an|the|) timer for {duration}', '(set|start) (a|an|the|) {name} timer for {duration}',
+            '(set|start) (a|an|the|) timer (called|named) {name} for {duration}',
+            '(set|start) (a|an|) {duration} timer', 'timer for {duration}'
+        ])
+        container.add_intent('timer_query', [
+            'how (much|long) (time|) (is|) left (on|in|for) (the|my|) {name} timer',
+            'how (much|long) (time|) (is|) left (on|in|for) (the|my|) timer',
+            'how long until (the|my|) {name} timer (is done|goes off|)',
+            'how long until (the|my|) timer (is done|goes off|)',
+            'what timers (do i have|are running|are set)', '(list|show) (my|all|the|) timers'
+        ])
+        container.add_intent('timer_pause', [
+            '(pause|hold) (the|my|) {name} timer', '(pause|hold) (the|my|) timer'
+        ])
+        container.add_intent('timer_resume', [
+            '(resume|unpause|continue|restart) (the|my|) {name} timer', '(resume|unpause|continue|restart) (the|my|) timer'
+        ])
+        container.add_intent('timer_cancel', [
+            '(cancel|stop|delete|remove) (the|my|) {name} timer', '(cancel|stop|delete|remove) (the|my|) timer',
+            '(cancel|stop|delete|remove) (all|all of|) (the|my|) timers'
+        ])
+        return container
+
+    def handle_intent(self, data):
+        name = data['name']
+        entities = data['entities']
+        with self.lock:
+            if name == 'timer_set':
+                return self.set_timer(data.get('utterance', entities.get('duration', '')), entities.get('name'))
+            if name == 'timer_query':
+                return self.query(entities.get('name'))
+            if name == 'timer_pause':
+                return self.pause(entities.get('name'))
+            if name == 'timer_resume':
+                return self.resume(entities.get('name'))
+            if name == 'timer_cancel':
+                return self.cancel(entities.get('name'))
+        return ''
+
+    def find(self, name):
+        """the timer with the given name, or the only timer if no name is given"""
+        if name:
+            return self.timers.get(name)
+        if len(self.timers) == 1:
+            return next(iter(self.timers.values()))
+        return None
+
+    def which(self):
+        """response for when it is not clear which timer the user means"""
+        if not self.timers:
+            return 'you dont have any timers set'
+        return 'which timer? you have a ' + ', a '.join(self.timers) + ' timer'
+
+    def start(self, countdown):
+        countdown.deadline = time.monotonic() + countdown.remaining
+        countdown.handle = self.wheel.schedule_at(countdown.deadline, self.finish, countdown)
+
+    def set_timer(self, utr, name=None):
+        seconds = parse_duration(utr)
+        if not seconds:
+            return 'didnt get how long the timer should be'
+
+        name = name or describe(seconds, plural=False)
+        if name in self.timers:
+            return 'you already have a ' + name + ' timer'
+        countdown = Countdown(name, seconds)
+        self.timers[name] = countdown
+        self.start(countdown)
+        return name + ' timer set for ' + describe(seconds)
+
+    def query(self, name=None):
+        if not name and len(self.timers) > 1:
+            ordered = sorted(self.timers.values(), key=lambda c: c.left())
+            return 'you have ' + str(len(ordered)) + ' timers. ' + '. '.join(
+                self.describe_left(c) for c in ordered)
+        countdown = self.find(name)
+        if not countdown:
+            return self.which()
+        return self.describe_left(countdown)
+
+    def describe_left(self, countdown):
+        response = describe(countdown.left()) + ' left on the ' + countdown.name + ' timer'
+        if countdown.deadline is None:
+            response += ', it is paused'
+        return response
+
+    def pause(self, name=None):
+        countdown = self.find(name)
+        if not countdown:
+            return self.which()
+        if countdown.deadline is None:
+            return 'the ' + countdown.name + ' timer is already paused'
+        self.wheel.cancel(countdown.handle)
+        countdown.remaining = countdown.left()
+        countdown.deadline = None
+        return 'paused the ' + countdown.name + ' timer with ' + describe(countdown.remaining) + ' left'
+
+    def resume(self, name=None):
+        countdown = self.find(name)
+        if not countdown:
+            return self.which()
+        if countdown.deadline is not None:
+            return 'the ' + countdown.name + ' timer is already running'
+        self.start(countdown)
+        return 'resumed the ' + countdown.name + ' timer, ' + describe(countdown.remaining) + ' left'
+
+    def cancel(self, name=None):
+        if not name and len(self.timers) > 1:
+            for countdown in self.timers.values():
+                self.wheel.cancel(countdown.handle)
+            self.timers = {}
+            return 'all timers cancelled'
+        countdown = self.find(name)
+        if not countdown:
+            return self.which()
+        self.wheel.cancel(countdown.handle)
+        del self.timers[countdown.name]
+        return 'cancelled the ' + countdown.name + ' timer'
+
+    def finish(self, countdown):
+        """called on the timing wheel's thread when a timer goes off"""
+        with self.lock:
+            if self.timers.get(countdown.name) is not countdown:
+                return
+            del self.timers[countdown.name]
+            self.finished.append(countdown.name)
+        if self.on_finish:
+            self.on_finish()
+
+    def announce_finished(self):
+        """announces the timers that went off, returns False if there were none"""
+        with self.lock:
+            finished, self.finished = self.finished, []
+        for name in finished:
+            speak('your ' + name + ' timer is done')
+        return len(finished) > 0
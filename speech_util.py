@@ -4,24 +4,22 @@
 from gtts import gTTS
 from playsound import playsound
 import speech_recognition as sr
+import re
 
-samplerate = 16000
 r = sr.Recognizer()
 
-def calibrate_mic():
-    with sr.Microphone(sample_rate=samplerate) as source2:
-        print("Calibrating... Silence please")
-        r.adjust_for_ambient_noise(source2, duration=2)
-        print("done")
-
-def transcribe():
-    with sr.Microphone(sample_rate=samplerate) as source2:
-        audio2 = r.listen(source2)
+def transcribe(audio, rate):
+    """transcribes the given 16 bit samples, the command captured by the wake word engine
+        (its command_audio at its capture_rate). Returns None if nothing was understood"""
+    if audio is None or not len(audio):
+        return None
     try:
-        text = r.recognize_google(audio2)
+        text = r.recognize_google(sr.AudioData(audio.tobytes(), rate, 2))
     except sr.UnknownValueError:
-        text = None
-    return text
+        return None
+
+    # commands captured after a detection start with the wake word itself
+    return re.sub(r'^\s*willow\W*', '', text, flags=re.IGNORECASE) or None
 
 def speak(sentence):
     print('out:', sentence)
@@ -5,19 +5,23 @@ print("Willow says hi!!!")
 print()
 print("[INFO] importing modules")
 
-from speech_util import calibrate_mic, transcribe, speak, ring_alarm
+from speech_util import transcribe, speak, ring_alarm
 from wake_word_engine import WakeWordEngine
-from willow import find_intent
+from willow import find_intent, warm_up
 from intent_handler import IntentHandler
 import pickle
 
 print('[INFO] modules imported')
 print()
 
-calibrate_mic()
+# the intent model loads in the background
+warm_up()
 
-wwe = WakeWordEngine()
-handler = IntentHandler()
+# the engine owns the one microphone stream and also captures the command from it. At 8 kHz
+# nothing has to be resampled for the wake word model, but commands are transcribed from
+# 8 kHz audio too
+wwe = WakeWordEngine(capture_at_resample_rate=True)
+handler = IntentHandler(wake=wwe.interrupt)
 
 random = 8
 with open('things/classes.pkl','rb') as file:
@@ -27,14 +31,18 @@ with open('things/classes.pkl','rb') as file:
 # this can be changed by changing the the variable 'random' or 
 # removing that variable altogether and running an infinite loop
 for x in range(random):
-    wwe.stream_until_willow()
+    wwe.stream_until_willow(handler.next_alarm())
 
     if handler.check_for_alarm():
         ring_alarm()
         continue
 
-    print('speak: ')  
-    utr = transcribe()
+    # reloads the intent model while the command is transcribed if it was unloaded
+    warm_up()
+
+    if wwe.command_audio is None:
+        wwe.listen_for_command()
+    utr = transcribe(wwe.command_audio, wwe.capture_rate)
 
     if utr:
         utr = utr.lower()
@@ -0,0 +1,39 @@
+""" Regression test of utils/datetime_parser.py against the parser it replaced.
+    datetime_corpus.jsonl holds the results AlarmSkill.extract_datetime_en gave
+    before it moved into the table-driven module: every alarm template at several
+    anchor dates plus random word salads over the parser's vocabulary. Run from
+    the repository root with python3 -m pytest tests
+
+    The one intended difference: the old parser raised IndexError on a bare "'s"
+    token (as in "it 's 7 am"), the new one drops the token and parses the rest """
+
+import json
+import os
+from datetime import datetime
+import pytest
+from utils.datetime_parser import extract_datetime_en
+
+CORPUS = os.path.join(os.path.dirname(__file__), 'datetime_corpus.jsonl')
+
+with open(CORPUS) as f:
+    cases = [json.loads(line) for line in f]
+
+
+def run(case):
+    try:
+        result = extract_datetime_en(case['text'], datetime.fromisoformat(case['anchor']))
+    except Exception as e:
+        return {'error': type(e).__name__}
+    if result is None:
+        return {'result': None}
+    return {'result': [result[0].isoformat(), result[1]]}
+
+
+@pytest.mark.parametrize('case', cases, ids=lambda case: case['text'] + ' @ ' + case['anchor'])
+def test_same_as_old_parser(case):
+    result = run(case)
+    if case.get('error') == 'IndexError' and "'s" in case['text'].split():
+        assert result.get('error') != 'IndexError'
+        return
+    expected = {k: v for k, v in case.items() if k in ('result', 'error')}
+    assert result == expected
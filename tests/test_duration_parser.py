@@ -0,0 +1,49 @@
+""" Spoken timer durations, numbers said as digits or as (compound) words """
+
+import pytest
+from utils.duration_parser import numbers_to_digits, parse_duration
+
+DURATIONS = [
+    ('set a timer for 1 day', 86400),
+    ('set a timer for 2 days', 172800),
+    ('set a pasta timer for 8 minutes', 480),
+    ('set a 10 minute timer', 600),
+    ('timer for an hour and a half', 5400),
+    ('set a timer for half an hour', 1800),
+    ('set a timer for a half hour', 1800),
+    ('set a timer for 1 and a half hours', 5400),
+    ('set a timer for 1.5 hours', 5400),
+    ('set a timer for 90 seconds', 90),
+    ('start a timer for a minute', 60),
+    ('set a timer for 5 mins', 300),
+    ('set a timer for 2 hours 30 minutes and 15 seconds', 9015),
+    ('set a timer for 2 hours and 30', 7200),
+    ('set a timer for 10 minutes and a half', 630),
+    ('set a timer for 1 day and 2 hours', 93600),
+    ('set a timer for one hour and ten minutes', 4200),
+    ('set a timer for twenty secs', 20),
+    ('set a timer for twenty five minutes', 1500),
+    ('set a timer for twenty-five minutes', 1500),
+    ('set a timer for one hour thirty seconds', 3630),
+    ('set a timer for thirteen minutes', 780),
+    ('set a timer for seventeen seconds', 17),
+    ('set a timer for forty five minutes and thirty seconds', 2730),
+    ('set a timer for a hundred seconds', 100),
+    ('set a timer for one hundred and twenty seconds', 120),
+    ('set a timer for two hundred fifty seconds', 250),
+    ('set a timer for ninety nine minutes', 5940),
+    ('set a timer', None),
+]
+
+
+@pytest.mark.parametrize('text, seconds', DURATIONS)
+def test_parse_duration(text, seconds):
+    assert parse_duration(text) == seconds
+
+
+def test_numbers_to_digits():
+    assert numbers_to_digits('twenty five'.split()) == ['25']
+    assert numbers_to_digits('five twenty'.split()) == ['5', '20']
+    assert numbers_to_digits('one hundred and six minutes'.split()) == ['106', 'minutes']
+    assert numbers_to_digits('ten and twenty'.split()) == ['10', 'and', '20']
+    assert numbers_to_digits('twenty ten'.split()) == ['20', '10']
@@ -0,0 +1,52 @@
+""" Checks that the wake word engine only decimates audio that is not captured at its
+    resample rate. Needs sounddevice, tflite_runtime or tensorflow and the real wake
+    word model (git lfs pull), the tests are skipped without them """
+
+import os
+import pytest
+
+pytest.importorskip('sounddevice')
+try:
+    import tflite_runtime  # noqa: F401
+except ImportError:
+    pytest.importorskip('tensorflow')
+
+import wake_word_engine
+from audio_bus import AudioBus
+from wake_word_engine import WakeWordEngine
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+with open(os.path.join(ROOT, 'models/wake_word_model_3.tflite'), 'rb') as f:
+    if f.read(7) == b'version':
+        pytest.skip('the wake word model is a git lfs pointer', allow_module_level=True)
+
+
+@pytest.fixture(autouse=True)
+def repository_root(monkeypatch):
+    monkeypatch.chdir(ROOT)
+
+
+def test_no_decimator_on_a_bus_at_the_resample_rate():
+    wwe = WakeWordEngine(bus=AudioBus(8000))
+    assert wwe.capture_rate == wwe.resample_rate == 8000
+    assert wwe.decimator is None
+    assert wwe.blocksize == int(8000 * wwe.rec_duration)
+
+
+def test_decimator_on_a_bus_at_the_default_rate():
+    wwe = WakeWordEngine(bus=AudioBus(16000))
+    assert wwe.capture_rate == 16000
+    assert wwe.decimator is not None
+
+
+def test_capture_at_resample_rate(monkeypatch):
+    monkeypatch.setattr(wake_word_engine, 'supports_rate', lambda rate, channels=1: True)
+    wwe = WakeWordEngine(capture_at_resample_rate=True)
+    assert wwe.bus.rate == 8000
+    assert wwe.decimator is None
+
+    monkeypatch.setattr(wake_word_engine, 'supports_rate', lambda rate, channels=1: False)
+    wwe = WakeWordEngine(capture_at_resample_rate=True)
+    assert wwe.bus.rate == 16000
+    assert wwe.decimator is not None
@@ -0,0 +1,34 @@
+""" Regression test of utils/wordpiece.py against the bert-for-tf2 tokenizer it
+    replaced. wordpiece_corpus.jsonl holds the ids the pickled tokenizer in
+    things/tokenizer.pkl gave for the strings tools/export_vocab.py checks, alarm
+    utterances, words glued together from vocabulary pieces and random unicode.
+    Run from the repository root with python3 -m pytest tests """
+
+import json
+import os
+import pytest
+from utils.wordpiece import WordPieceTokenizer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS = os.path.join(os.path.dirname(__file__), 'wordpiece_corpus.jsonl')
+
+with open(CORPUS, encoding='utf-8') as f:
+    cases = [json.loads(line) for line in f]
+
+
+@pytest.fixture(scope='module')
+def tokenizer():
+    return WordPieceTokenizer(os.path.join(ROOT, 'things/wordpiece.bin'))
+
+
+@pytest.mark.parametrize('case', cases, ids=lambda case: repr(case['text'])[:60])
+def test_same_ids_as_bert_tokenizer(tokenizer, case):
+    assert tokenizer.encode(case['text']).tolist() == case['ids']
+
+
+def test_cached_words_give_the_same_ids(tokenizer):
+    tokenizer.cache.clear()
+    for case in cases:
+        tokenizer.encode(case['text'])
+    for case in cases:
+        assert tokenizer.encode(case['text']).tolist() == case['ids']
@@ -0,0 +1,58 @@
+"""Measures the intent model's latency at candidate input length buckets, next to
+    the 30 tokens it was trained at. Run from the repository
+    root on the target device:
+
+        python3 -m tools.benchmark_buckets [invokes per bucket]
+
+    Every bucket is fed random token ids, so the numbers are the cost of one
+    invoke at that length whatever the utterance is. The token counts of a few
+    typical commands show which bucket they would land in. Before configuring
+    shorter buckets, check their accuracy with tools/evaluate_intents.py --buckets.
+    Only one interpreter is loaded at a time."""
+
+import sys
+import time
+import numpy as np
+import willow
+from utils.wordpiece import WordPieceTokenizer
+
+CANDIDATES = [8, 16, 32, 64]
+
+COMMANDS = ['set an alarm for 7', 'wake me up at 6 30 tomorrow morning',
+            'set an alarm for 8 am every monday wednesday and friday until the end of the month']
+
+
+def time_invokes(bucket, invokes):
+    """median and 95th percentile milliseconds per invoke"""
+    rng = np.random.default_rng(0)
+    times = []
+    for _ in range(invokes):
+        bucket.input()[...] = rng.integers(1000, 2000, (1, bucket.length))
+        start = time.perf_counter()
+        bucket.interpreter.invoke()
+        times.append(time.perf_counter() - start)
+    return np.median(times) * 1000, np.percentile(times, 95) * 1000
+
+
+def main():
+    invokes = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+    print('| tokens | median (ms) | p95 (ms) |')
+    print('|---|---|---|')
+    for length in CANDIDATES + [None]:
+        bucket = willow.IntentBucket(length)
+        median, p95 = time_invokes(bucket, invokes)
+        name = '%d (trained)' % bucket.length if length is None else length
+        print('| %s | %.2f | %.2f |' % (name, median, p95))
+        del bucket
+
+    print()
+    tokenizer = WordPieceTokenizer()
+    for utr in COMMANDS:
+        length = len(tokenizer.encode(utr)) + 2
+        size = next((n for n in CANDIDATES if n >= length), CANDIDATES[-1])
+        print('%2d tokens, bucket %2d: %s' % (length, size, utr))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Measures the cost of the wake word engine for several window hops and prints a
+    latency/cpu trade-off table. Run from the repository root on the target device:
+
+        python3 -m tools.benchmark_hop [seconds of audio per hop size]
+
+    Audio is white noise fed straight into WakeWordEngine.process_recording, so the
+    numbers cover the whole per-hop path of the inference worker (resampling,
+    filtering, mfccs, inference) but not the microphone itself.
+
+    There is no committed results table, since the numbers only mean something
+    on the device that runs Willow. The benchmark needs the real wake word model
+    (git lfs pull) and tensorflow or tflite-runtime"""
+
+import sys
+import time
+import numpy as np
+from wake_word_engine import WakeWordEngine
+
+HOPS = [0.1, 0.25, 0.5]
+
+
+def benchmark(hop, seconds):
+    """returns the cpu seconds spent on every hop of `seconds` of audio"""
+    wwe = WakeWordEngine(window_stride=hop)
+    wwe.print_scores = False
+    # measure the full path, as if there was speech in every window. A detection must
+    # not turn the following hops into command recording, which skips inference
+    wwe.use_voice_gate = False
+    wwe.capture_command = False
+
+    blocksize = int(wwe.capture_rate * hop)
+    rng = np.random.default_rng(0)
+    blocks = [rng.normal(0, 0.01, blocksize).astype(np.float32)
+              for _ in range(int(seconds / hop))]
+
+    # fill the window once so every measured hop sees a full window
+    for block in blocks[:int(wwe.window_duration / hop)]:
+        wwe.process_recording(block)
+
+    costs = []
+    for block in blocks:
+        start = time.process_time()
+        wwe.process_recording(block)
+        costs.append(time.process_time() - start)
+    return np.array(costs)
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 30
+
+    print('| hop (ms) | mean cost (ms) | p95 cost (ms) | cpu (%) | worst-case latency (ms) |')
+    print('|---|---|---|---|---|')
+    for hop in HOPS:
+        costs = benchmark(hop, seconds)
+        p95 = np.percentile(costs, 95)
+        # a word ending just after a hop boundary is seen one hop later, then processed
+        latency = hop + p95
+        print('| %d | %.1f | %.1f | %.1f | %d |' % (hop * 1000, costs.mean() * 1000, p95 * 1000,
+                                                   100 * costs.mean() / hop, latency * 1000))
+
+
+if __name__ == '__main__':
+    main()
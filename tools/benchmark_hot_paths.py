@@ -0,0 +1,92 @@
+"""Measures the latency and memory allocated per call of the two inference hot paths,
+    find_intent and WakeWordEngine.predict_willow, next to the way they used to be
+    written (building a new input array on every call, copying the output out of
+    the interpreter and always padding to 30 tokens). Run from the repository root:
+
+        python3 -m tools.benchmark_hot_paths [calls per path]
+
+    Allocations are traced with tracemalloc in a separate pass, so tracing does not
+    slow down the latency numbers. Each result is the peak number of bytes allocated
+    during a call. Tokenization is included in both intent paths."""
+
+import sys
+import time
+import tracemalloc
+import numpy as np
+import willow
+from utils.inference import load_interpreter
+from utils.models import registry
+from wake_word_engine import WakeWordEngine
+
+UTTERANCES = ['set an alarm for 7', 'wake me up at 6 30 tomorrow', 'what alarms do i have',
+              'delete my alarm for monday', 'set an alarm for 8 am every weekday',
+              'do i have an alarm tomorrow morning']
+
+
+def find_intent_before(tokenizer, interpreter, utr):
+    token_ids = [[tokenizer.cls_id] + tokenizer.encode(utr).tolist() + [tokenizer.sep_id]]
+    token_ids[0] += [0]*(30-len(token_ids[0]))
+    token_ids = np.array(list(token_ids), dtype=np.int32)
+
+    interpreter.set_tensor(interpreter.get_input_details()[0]['index'], token_ids)
+    interpreter.invoke()
+    output_data = interpreter.get_tensor(interpreter.get_output_details()[0]['index'])
+    highest_probability = np.amax(output_data)
+    index = np.where(output_data == highest_probability)[1][0]
+    return (index, highest_probability)
+
+
+def predict_willow_before(wwe, mfccs):
+    in_tensor = np.float32(mfccs.reshape(1, mfccs.shape[0], mfccs.shape[1], 1))
+    wwe.interpreter.set_tensor(wwe.input_details[0]['index'], in_tensor)
+    wwe.interpreter.invoke()
+    output_data = wwe.interpreter.get_tensor(wwe.output_details[0]['index'])
+    return output_data[0][0]
+
+
+def measure(func, args, calls):
+    """median microseconds and median peak bytes allocated per call"""
+    times = []
+    for i in range(calls):
+        start = time.perf_counter()
+        func(*args[i % len(args)])
+        times.append(time.perf_counter() - start)
+
+    allocated = []
+    tracemalloc.start()
+    for i in range(calls):
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        func(*args[i % len(args)])
+        allocated.append(tracemalloc.get_traced_memory()[1] - current)
+    tracemalloc.stop()
+    return np.median(times) * 1e6, np.median(allocated)
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    model = registry.get('intent')
+    # the model as it used to be run, always at its converted length of 30 tokens
+    interpreter = load_interpreter(willow.model_path)
+    wwe = WakeWordEngine()
+    wwe.print_scores = False
+    rng = np.random.default_rng(0)
+    # transposed (num_mfcc, frames) views, the layout StreamingMfcc.update returns
+    mfccs = [wwe.frontend.mfcc(rng.normal(0, 0.01, len(wwe.window))).transpose() for _ in range(4)]
+
+    paths = [('find_intent', 'before', find_intent_before,
+              [(model.tokenizer, interpreter, u) for u in UTTERANCES]),
+             ('find_intent', 'after', willow.find_intent, [(u,) for u in UTTERANCES]),
+             ('predict_willow', 'before', predict_willow_before, [(wwe, m) for m in mfccs]),
+             ('predict_willow', 'after', wwe.predict_willow, [(m,) for m in mfccs])]
+
+    print('| path | version | latency (us) | allocated per call (bytes) |')
+    print('|---|---|---|---|')
+    for name, version, func, args in paths:
+        latency, allocated = measure(func, args, calls)
+        print('| %s | %s | %.1f | %d |' % (name, version, latency, allocated))
+
+
+if __name__ == '__main__':
+    main()
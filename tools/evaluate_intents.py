@@ -0,0 +1,119 @@
+"""Evaluates the intent model on a labelled corpus of utterances, no microphone
+    needed, so a model swap can be regression tested on a workstation. Run from
+    the repository root:
+
+        python3 -m tools.evaluate_intents utterances.csv [--batch-size 32]
+                                          [--min-accuracy 0.9] [--matrix matrix.csv]
+                                          [--buckets 8 16 32 64]
+
+    A csv file has one utterance per line: utterance,label. A jsonl file has an
+    'utterance' (or 'text') and a 'label' (or 'intent') field per line. Labels are
+    names from things/classes.pkl or their indices. Prints the accuracy, a
+    confusion matrix of the classes that occur and utterances classified per
+    second. The run fails when the accuracy is below --min-accuracy.
+
+    --buckets runs the model at other input lengths than the configured ones, e.g.
+    to check that shorter buckets lose no accuracy before configuring them. Run
+    once without and once with it and compare."""
+
+import argparse
+import csv
+import json
+import pickle
+import sys
+import time
+import numpy as np
+from willow import IntentModel, classify
+from utils.models import registry
+
+
+def read_labelled(path):
+    """(utterance, label) pairs of a csv or jsonl file"""
+    pairs = []
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    pairs.append((row.get('utterance', row.get('text')),
+                                  str(row.get('label', row.get('intent')))))
+        else:
+            pairs = [(row[0], row[1].strip()) for row in csv.reader(f) if len(row) >= 2]
+    return pairs
+
+
+def print_matrix(matrix, classes):
+    """rows are the true classes, columns the predicted ones, numbered like the rows"""
+    present = [i for i in range(len(classes)) if matrix[i].any() or matrix[:, i].any()]
+    width = max(3, len(str(matrix.max())))
+    name_width = max(len(classes[i]) for i in present)
+    print(' ' * (name_width + 5) + ''.join('%*d' % (width + 1, n) for n in range(len(present))))
+    for n, i in enumerate(present):
+        print('%2d. %-*s ' % (n, name_width, classes[i]) +
+              ''.join('%*s' % (width + 1, matrix[i, j] or '.') for j in present))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluate the intent model on labelled utterances')
+    parser.add_argument('corpus', help='csv or jsonl file of utterances and labels')
+    parser.add_argument('--batch-size', type=int, default=32, help='utterances per invoke')
+    parser.add_argument('--min-accuracy', type=float, help='fail below this accuracy (0-1)')
+    parser.add_argument('--matrix', help='also write the full confusion matrix to this csv file')
+    parser.add_argument('--errors', action='store_true', help='print every misclassified utterance')
+    parser.add_argument('--buckets', type=int, nargs='+', help='input lengths to run the model at')
+    args = parser.parse_args()
+
+    with open('things/classes.pkl', 'rb') as file:
+        classes = pickle.load(file)
+    index_of = {name: i for i, name in enumerate(classes)}
+    index_of.update({str(i): i for i in range(len(classes))})
+
+    utterances = []
+    labels = []
+    for utr, label in read_labelled(args.corpus):
+        if label not in index_of:
+            print('[WARNING] unknown label', repr(label), 'for', repr(utr))
+            continue
+        utterances.append(utr.lower())
+        labels.append(index_of[label])
+    if not utterances:
+        sys.exit('no labelled utterances in ' + args.corpus)
+    labels = np.array(labels)
+
+    # load the model and the batch interpreters before timing
+    model = IntentModel(args.buckets) if args.buckets else registry.get('intent')
+    for length in set(model.size(len(model.tokenizer.encode(utr)) + 2) for utr in utterances):
+        model.batch(args.batch_size, length)
+    start = time.perf_counter()
+    predicted, probabilities = classify(utterances, args.batch_size, model)
+    seconds = time.perf_counter() - start
+
+    matrix = np.zeros((len(classes), len(classes)), dtype=np.int64)
+    np.add.at(matrix, (labels, predicted), 1)
+    accuracy = np.mean(predicted == labels)
+
+    if args.errors:
+        for i in np.flatnonzero(predicted != labels):
+            print('%s: %s, predicted %s (%.2f)' % (utterances[i], classes[labels[i]],
+                                                  classes[predicted[i]], probabilities[i]))
+        print()
+    print_matrix(matrix, classes)
+    print()
+    print('buckets:', model.lengths or [model.fixed.length])
+    print('accuracy: %d/%d (%.1f%%)' % (np.sum(predicted == labels), len(labels), 100 * accuracy))
+    print('throughput: %.1f utterances per second (batch size %d)' % (len(labels) / seconds,
+                                                                     args.batch_size))
+
+    if args.matrix:
+        with open(args.matrix, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['true \\ predicted'] + classes)
+            for name, row in zip(classes, matrix):
+                writer.writerow([name] + row.tolist())
+
+    if args.min_accuracy is not None and accuracy < args.min_accuracy:
+        sys.exit('accuracy %.3f is below %.3f' % (accuracy, args.min_accuracy))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+"""Offline benchmark and evaluation of the wake word engine on recorded WAV files,
+    no microphone needed. Recordings are cut into stream sized blocks and pushed
+    through the audio bus callback and the inference worker path as fast as
+    possible. Run from the repository root:
+
+        python3 -m tools.evaluate_wake_word labels.csv [--hop 0.5] [--pad 1.0]
+        python3 -m tools.evaluate_wake_word clip1.wav clip2.wav ...
+
+    The labels file has one clip per line: path,label[,keyword_end] where label is 1
+    if the clip contains willow and 0 otherwise, and keyword_end is the time in
+    seconds at which willow finishes (used for detection latency). Paths are
+    relative to the labels file. Bare WAV files are treated as negatives."""
+
+import argparse
+import csv
+import os
+import time
+import wave
+import numpy as np
+from wake_word_engine import WakeWordEngine
+from utils.decision import WakeWordDecision
+
+
+class FileAudioSource:
+    """Reads a PCM WAV file and yields (frames, channels) float32 blocks, the same
+    shape and scale sounddevice hands to the stream callback"""
+
+    def __init__(self, path, blocksize):
+        with wave.open(path, 'rb') as f:
+            self.rate = f.getframerate()
+            channels = f.getnchannels()
+            width = f.getsampwidth()
+            data = f.readframes(f.getnframes())
+
+        if width == 1:
+            audio = (np.frombuffer(data, dtype=np.uint8).astype(np.float32) - 128) / 128
+        elif width == 2:
+            audio = np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768
+        elif width == 4:
+            audio = np.frombuffer(data, dtype=np.int32).astype(np.float32) / 2147483648
+        else:
+            raise ValueError('unsupported sample width in ' + path)
+
+        self.audio = audio.reshape(-1, channels)[:, :1]
+        self.blocksize = blocksize
+
+    @property
+    def duration(self):
+        return len(self.audio) / self.rate
+
+    def pad(self, seconds):
+        """appends silence so words at the very end of the clip get a full window"""
+        silence = np.zeros((int(seconds * self.rate), 1), dtype=np.float32)
+        self.audio = np.concatenate((self.audio, silence))
+
+    def blocks(self):
+        """full blocks only, like a stream that is closed mid block"""
+        for start in range(0, len(self.audio) - self.blocksize + 1, self.blocksize):
+            yield self.audio[start:start + self.blocksize]
+
+
+class StreamClock:
+    """seconds of audio streamed so far, the decision layer's clock while clips are
+    pushed through faster than real time"""
+
+    def __init__(self):
+        self.seconds = 0.0
+
+    def __call__(self):
+        return self.seconds
+
+
+class StageTimer:
+    """Wraps engine methods so every call to them is timed"""
+
+    def __init__(self):
+        self.times = {}
+
+    def wrap(self, obj, name, stage):
+        func = getattr(obj, name)
+        times = self.times.setdefault(stage, [])
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            times.append(time.perf_counter() - start)
+            return result
+        setattr(obj, name, timed)
+
+
+def run_clip(wwe, source, clock):
+    """streams one clip through the engine, returns the stream times (in seconds) at
+    which the decision layer triggered. Windows above the threshold that did not
+    trigger (votes, smoothing, refractory period) are not detections"""
+    # clips are independent, a trigger at the end of one must not mute the next
+    wwe.reset(keep_refractory=False)
+    detections = []
+    triggers = wwe.decision.triggers
+    blocksize = source.blocksize
+    subscription = wwe.bus.subscribe()
+    for i, block in enumerate(source.blocks()):
+        wwe.bus.callback(block, blocksize, None, None)
+
+        # stand in for the inference worker, in this thread so the run is deterministic
+        rec = subscription.read(wwe.blocksize, timeout=0)
+        while rec is not None:
+            clock.seconds += len(rec) / source.rate
+            wwe.process_recording(rec)
+            rec = subscription.read(wwe.blocksize, timeout=0)
+
+        # a block can hold more than one hop, so count the triggers rather than the event
+        if wwe.decision.triggers > triggers:
+            detections += [(i + 1) * blocksize / source.rate] * (wwe.decision.triggers - triggers)
+            triggers = wwe.decision.triggers
+        wwe.detected.clear()
+    subscription.close()
+    return detections
+
+
+def read_labels(path):
+    clips = []
+    folder = os.path.dirname(path)
+    with open(path, newline='') as f:
+        for row in csv.reader(f):
+            if not row or row[0].startswith('#'):
+                continue
+            keyword_end = float(row[2]) if len(row) > 2 and row[2] else None
+            clips.append((os.path.join(folder, row[0]), int(row[1]), keyword_end))
+    return clips
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluate the wake word engine on WAV files')
+    parser.add_argument('inputs', nargs='+', help='labels csv file or WAV files')
+    parser.add_argument('--hop', type=float, default=0.5, help='window stride in seconds')
+    parser.add_argument('--pad', type=float, default=1.0, help='seconds of silence after each clip')
+    parser.add_argument('--smoothing', type=int, default=1, help='moving average length in windows')
+    parser.add_argument('--votes', type=int, nargs=2, default=[1, 1], metavar=('N', 'M'),
+                        help='trigger when N of the last M windows are above the threshold')
+    parser.add_argument('--refractory', type=float, default=2.0, help='seconds without triggers after one')
+    args = parser.parse_args()
+
+    if len(args.inputs) == 1 and args.inputs[0].endswith('.csv'):
+        clips = read_labels(args.inputs[0])
+    else:
+        clips = [(path, 0, None) for path in args.inputs]
+
+    wwe = WakeWordEngine(window_stride=args.hop)
+    wwe.print_scores = False
+    # every detection is counted, nothing after it is treated as a command
+    wwe.capture_command = False
+    clock = StreamClock()
+    wwe.decision = WakeWordDecision(wwe.word_threshold, args.smoothing, args.votes[0], args.votes[1],
+                                    args.refractory, clock)
+    blocksize = wwe.blocksize
+
+    timer = StageTimer()
+    if wwe.decimator:
+        timer.wrap(wwe.decimator, 'process', 'resample')
+    timer.wrap(wwe.high_pass, 'process', 'filter')
+    timer.wrap(wwe.features, 'update', 'mfcc')
+    timer.wrap(wwe, 'predict_willow', 'inference')
+
+    audio_seconds = 0
+    processing_seconds = 0
+    negative_seconds = 0
+    false_accepts = 0
+    positives = 0
+    hits = 0
+    latencies = []
+
+    for path, label, keyword_end in clips:
+        source = FileAudioSource(path, blocksize)
+        if source.rate != wwe.capture_rate:
+            raise ValueError('%s is sampled at %d Hz, the engine captures at %d Hz'
+                             % (path, source.rate, wwe.capture_rate))
+        # the padding is only there to flush the last window, it is not audio of the clip
+        duration = source.duration
+        source.pad(args.pad)
+
+        start = time.perf_counter()
+        detections = run_clip(wwe, source, clock)
+        processing_seconds += time.perf_counter() - start
+        audio_seconds += duration
+
+        if label:
+            positives += 1
+            if detections:
+                hits += 1
+                if keyword_end is not None:
+                    latencies.append(detections[0] - keyword_end)
+        else:
+            negative_seconds += duration
+            false_accepts += len(detections)
+        print('%s: label %d, detections at %s' % (path, label, ['%.2f' % d for d in detections]))
+
+    print()
+    print('audio: %.1f s, processing: %.2f s, real-time factor: %.4f'
+          % (audio_seconds, processing_seconds, processing_seconds / audio_seconds))
+    for stage, times in timer.times.items():
+        if times:
+            times = np.array(times) * 1000
+            print('%-10s mean %.2f ms, p95 %.2f ms over %d calls'
+                  % (stage, times.mean(), np.percentile(times, 95), len(times)))
+    total_windows = wwe.windows_processed + wwe.windows_skipped
+    if total_windows:
+        print('windows skipped by the voice activity gate: %d/%d (%.1f%%)'
+              % (wwe.windows_skipped, total_windows, 100 * wwe.windows_skipped / total_windows))
+    print('triggers: %d, single window spikes suppressed by the decision layer: %d'
+          % (wwe.decision.triggers, wwe.decision.suppressed))
+    if positives:
+        print('detection rate: %d/%d (%.1f%%)' % (hits, positives, 100 * hits / positives))
+    if latencies:
+        print('detection latency: mean %.0f ms, max %.0f ms'
+              % (1000 * np.mean(latencies), 1000 * np.max(latencies)))
+    if negative_seconds:
+        print('false accepts: %d in %.1f min (%.2f per hour)'
+              % (false_accepts, negative_seconds / 60, false_accepts / (negative_seconds / 3600)))
+
+
+if __name__ == '__main__':
+    main()
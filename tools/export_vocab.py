@@ -0,0 +1,102 @@
+"""Exports the vocabulary of the pickled bert-for-tf2 tokenizer in things/tokenizer.pkl
+    to the trie file utils/wordpiece.py memory maps, and checks that both
+    tokenizers give the same ids. Run from the repository root:
+
+        python3 -m tools.export_vocab export
+        python3 -m tools.export_vocab check [corpus.txt ...]
+
+    export needs no bert-for-tf2, the pickle is read with stand-ins for its
+    classes. check runs the pickled tokenizer itself (so it does need
+    bert-for-tf2) on a built in set of tricky strings plus one utterance per line
+    of the given files, and prints every utterance the two disagree on. Without
+    bert-for-tf2, tests/test_wordpiece.py compares against ids recorded from it."""
+
+import argparse
+import pickle
+import time
+from utils.wordpiece import WordPieceTokenizer, write_trie
+
+PICKLE_PATH = 'things/tokenizer.pkl'
+TRIE_PATH = 'things/wordpiece.bin'
+
+CORPUS = ['set an alarm for 7', 'Wake me up at 6:30 A.M. tomorrow!', "what's my next alarm?",
+          'remind me at 10pm... please', 'unaffable', 'Caf\u00e9 na\u00efve r\u00e9sum\u00e9',
+          '\u0130stanbul \u03a3\u038a\u03a3\u03a5\u03a6\u039f\u03a3', 'stra\u00dfe',
+          'set alarm \u6771\u4eac at 5', '\ud55c\uad6d\uc5b4 \u30c6\u30b9\u30c8',
+          'tab\tnew\nline\rreturn', 'zero\x00width\u200bspace\ufffd',
+          'non\xa0breaking\u2028line\u2029para\u3000ideographic', '#hashtag ##double',
+          '[CLS] [SEP] [UNK]', 'a' * 201, 'a' * 200, '\u00a1hola! \u00bfqu\u00e9?',
+          'emoji \U0001f600 test', 'x\u0301\u0301\u0301', '\u0301', '\ufb01ne ligature',
+          '1/2 3.5 $40 50%', '\x7f\x1f\x0b\x0c\x85', '', '   ', '\u01c5emal \u01c8']
+
+
+class StandIn:
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+
+class VocabUnpickler(pickle.Unpickler):
+    """reads the tokenizer pickle without importing bert"""
+
+    def find_class(self, module, name):
+        if module.startswith('bert.'):
+            return type(name, (StandIn,), {})
+        if (module, name) == ('collections', 'OrderedDict'):
+            return super().find_class(module, name)
+        raise pickle.UnpicklingError('unexpected class ' + module + '.' + name)
+
+
+def export():
+    with open(PICKLE_PATH, 'rb') as f:
+        tokenizer = VocabUnpickler(f).load()
+    wordpiece = tokenizer.wordpiece_tokenizer
+    write_trie(tokenizer.vocab, TRIE_PATH, wordpiece.unk_token, wordpiece.max_input_chars_per_word,
+               tokenizer.basic_tokenizer.do_lower_case)
+    print('wrote', len(tokenizer.vocab), 'tokens to', TRIE_PATH)
+
+
+def check(paths):
+    with open(PICKLE_PATH, 'rb') as f:
+        reference = pickle.load(f)
+    tokenizer = WordPieceTokenizer(TRIE_PATH)
+
+    corpus = list(CORPUS)
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            corpus += [line.rstrip('\n') for line in f]
+
+    mismatches = 0
+    times = [0, 0]
+    for utr in corpus:
+        start = time.perf_counter()
+        expected = reference.convert_tokens_to_ids(reference.tokenize(utr))
+        times[0] += time.perf_counter() - start
+        # a fresh cache would flatter the trie tokenizer less than a warm one
+        tokenizer.cache.clear()
+        start = time.perf_counter()
+        ids = tokenizer.encode(utr).tolist()
+        times[1] += time.perf_counter() - start
+        if ids != expected:
+            mismatches += 1
+            print('mismatch:', repr(utr))
+            print('  pickled:', expected)
+            print('  trie:   ', ids)
+
+    print('%d utterances, %d mismatches' % (len(corpus), mismatches))
+    print('pickled tokenizer %.1f us, trie tokenizer %.1f us per utterance' % (
+        times[0] / len(corpus) * 1e6, times[1] / len(corpus) * 1e6))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('command', choices=['export', 'check'])
+    parser.add_argument('corpus', nargs='*')
+    args = parser.parse_args()
+    if args.command == 'export':
+        export()
+    else:
+        check(args.corpus)
+
+
+if __name__ == '__main__':
+    main()
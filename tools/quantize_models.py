@@ -0,0 +1,194 @@
+"""Post-training quantization of willow's two models. Needs full tensorflow and the
+    models in SavedModel or Keras form (the .tflite files can not be converted
+    again). Run from the repository root:
+
+        python3 -m tools.quantize_models quantize --intent-model bert_saved_model \\
+            --utterances utterances.csv --wake-model wake_word.h5 --clips clips/*.wav
+
+    writes models/model_dynamic.tflite, models/model_int8.tflite,
+    models/wake_word_model_3_dynamic.tflite and models/wake_word_model_3_int8.tflite
+    (dynamic range and full integer variants), calibrated on representative inputs:
+    utterances tokenized and padded to the bucket length find_intent runs them at
+    and mfcc windows computed the way the wake word engine does it from clips at
+    its capture rate (16 kHz). 80% of the inputs calibrate the int8 models, the
+    rest are held out to report size, latency and agreement with the float
+    .tflite model. Utterances are read from the first column of a csv, a jsonl
+    'utterance' (or 'text') field, or one per line of a text file.
+
+        python3 -m tools.quantize_models select models/model.tflite int8
+
+    makes the runtime load the int8 variant of models/model.tflite"""
+
+import argparse
+import csv
+import json
+import os
+import time
+import numpy as np
+import tensorflow as tf
+from utils import inference
+
+INTENT_MODEL = 'models/model.tflite'
+WAKE_MODEL = 'models/wake_word_model_3.tflite'
+
+
+def read_utterances(path):
+    utterances = []
+    with open(path, newline='') as f:
+        if path.endswith('.jsonl'):
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    utterances.append(row.get('utterance', row.get('text')))
+        elif path.endswith('.csv'):
+            utterances = [row[0] for row in csv.reader(f) if row]
+        else:
+            utterances = [line.strip() for line in f if line.strip()]
+    return utterances
+
+
+def intent_inputs(utterances):
+    """(1, length) token id arrays, exactly what find_intent feeds the model. The length
+    is the bucket the utterance lands in with the configured buckets (30 by default)"""
+    import willow
+    from utils.wordpiece import WordPieceTokenizer
+
+    tokenizer = WordPieceTokenizer()
+    lengths = sorted(inference.load_config().get(INTENT_MODEL, {}).get('buckets', willow.buckets))
+    inputs = []
+    for utr in utterances:
+        token_ids = tokenizer.encode(utr.lower())
+        length = next((n for n in lengths if n >= len(token_ids) + 2), lengths[-1])
+        inputs.append(willow.fill(np.zeros((1, length), dtype=np.int32), tokenizer, token_ids))
+    return inputs
+
+
+def wake_inputs(paths):
+    """(1, num_mfcc, frames, 1) mfcc windows of every hop of the clips"""
+    from wake_word_engine import WakeWordEngine
+    from tools.evaluate_wake_word import FileAudioSource
+
+    wwe = WakeWordEngine()
+    windows = []
+    for path in paths:
+        wwe.reset()
+        source = FileAudioSource(path, wwe.blocksize)
+        if source.rate != wwe.capture_rate:
+            raise ValueError('%s is sampled at %d Hz, the engine captures at %d Hz'
+                             % (path, source.rate, wwe.capture_rate))
+        for block in source.blocks():
+            wwe.add_recording(np.squeeze(block))
+            mfccs = wwe.features.update(wwe.window)
+            windows.append(np.float32(mfccs.reshape(1, mfccs.shape[0], mfccs.shape[1], 1)))
+    return windows
+
+
+def load_source(path):
+    if os.path.isdir(path):
+        return tf.lite.TFLiteConverter.from_saved_model(path)
+    return tf.lite.TFLiteConverter.from_keras_model(tf.keras.models.load_model(path))
+
+
+def convert(source_path, variant, calibration):
+    """returns the flatbuffer of a dynamic range or full integer model"""
+    converter = load_source(source_path)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if variant == 'int8':
+        converter.representative_dataset = lambda: ([x] for x in calibration)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    return converter.convert()
+
+
+def run(model_path, variant, inputs):
+    """outputs of a model variant on every input, and the median seconds per invoke"""
+    interpreter = inference.load_interpreter(model_path, variant=variant)
+    input_index = interpreter.get_input_details()[0]['index']
+    output_index = interpreter.get_output_details()[0]['index']
+
+    outputs = []
+    times = []
+    for x in inputs:
+        # intent inputs come in several bucket lengths
+        if tuple(interpreter.get_input_details()[0]['shape']) != x.shape:
+            interpreter.resize_tensor_input(input_index, x.shape)
+            interpreter.allocate_tensors()
+        interpreter.set_tensor(input_index, x)
+        start = time.perf_counter()
+        interpreter.invoke()
+        times.append(time.perf_counter() - start)
+        outputs.append(interpreter.get_tensor(output_index)[0].copy())
+    return np.array(outputs), np.median(times)
+
+
+def report(model_path, held_out, agreement):
+    reference, _ = run(model_path, 'float', held_out)
+    print(model_path)
+    print('  %-8s %10s %12s %10s' % ('variant', 'size (kB)', 'latency (ms)', 'agreement'))
+    for variant in inference.variants:
+        path = inference.variant_path(model_path, variant)
+        if not os.path.exists(path):
+            continue
+        outputs, seconds = run(model_path, variant, held_out)
+        print('  %-8s %10d %12.2f %9.1f%%' % (variant, os.path.getsize(path) / 1000,
+                                            seconds * 1000, 100 * agreement(reference, outputs)))
+
+
+def same_intent(reference, outputs):
+    return np.mean(np.argmax(reference, axis=1) == np.argmax(outputs, axis=1))
+
+
+def same_wake_decision(reference, outputs, threshold=0.5):
+    return np.mean((reference[:, 0] > threshold) == (outputs[:, 0] > threshold))
+
+
+def quantize(source_path, model_path, inputs, agreement):
+    split = max(1, int(len(inputs) * 0.8))
+    calibration, held_out = inputs[:split], inputs[split:] or inputs
+    for variant in ('dynamic', 'int8'):
+        path = inference.variant_path(model_path, variant)
+        with open(path, 'wb') as f:
+            f.write(convert(source_path, variant, calibration))
+        print('wrote', path)
+    report(model_path, held_out, agreement)
+
+
+def select(model_path, variant):
+    inference.variant_path(model_path, variant)
+    config = inference.load_config()
+    config.setdefault(model_path, {})['variant'] = variant
+    inference.save_config(config)
+    print(model_path, 'will load the', variant, 'variant')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Quantize the intent and wake word models')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('quantize', help='build and evaluate quantized variants')
+    build.add_argument('--intent-model', help='SavedModel directory or Keras file of the BERT model')
+    build.add_argument('--utterances', help='utterances for calibration and evaluation')
+    build.add_argument('--wake-model', help='SavedModel directory or Keras file of the wake word model')
+    build.add_argument('--clips', nargs='+', help='16 kHz WAV files (the engine\'s capture rate) for calibration and evaluation')
+
+    choose = commands.add_parser('select', help='choose the variant the runtime loads')
+    choose.add_argument('model', choices=[INTENT_MODEL, WAKE_MODEL])
+    choose.add_argument('variant', choices=inference.variants)
+
+    args = parser.parse_args()
+    if args.command == 'select':
+        select(args.model, args.variant)
+        return
+
+    if args.intent_model:
+        if not args.utterances:
+            parser.error('--intent-model needs --utterances')
+        inputs = intent_inputs(read_utterances(args.utterances))
+        quantize(args.intent_model, INTENT_MODEL, inputs, same_intent)
+    if args.wake_model:
+        if not args.clips:
+            parser.error('--wake-model needs --clips')
+        quantize(args.wake_model, WAKE_MODEL, wake_inputs(args.clips), same_wake_decision)
+
+
+if __name__ == '__main__':
+    main()
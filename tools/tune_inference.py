@@ -0,0 +1,77 @@
+"""Benchmarks every thread count / XNNPACK combination for willow's models on this
+    device and saves the fastest one to things/inference_config.json, which
+    utils.inference.load_interpreter reads. Run from the repository root:
+
+        python3 -m tools.tune_inference [invokes per configuration]"""
+
+import gc
+import os
+import sys
+import time
+import numpy as np
+from utils import inference
+
+MODELS = ['models/model.tflite', 'models/wake_word_model_3.tflite']
+
+
+def thread_counts():
+    counts = [1, 2, 4, 8]
+    return [n for n in counts if n <= (os.cpu_count() or 1)]
+
+
+def time_invokes(interpreter, invokes):
+    """median seconds per invoke on random input"""
+    rng = np.random.default_rng(0)
+    for detail in interpreter.get_input_details():
+        if np.issubdtype(detail['dtype'], np.integer):
+            data = rng.integers(0, 1000, detail['shape']).astype(detail['dtype'])
+        else:
+            data = rng.normal(size=detail['shape']).astype(detail['dtype'])
+        interpreter.set_tensor(detail['index'], data)
+
+    # the first invoke includes lazy initialisation
+    interpreter.invoke()
+    times = []
+    for _ in range(invokes):
+        start = time.perf_counter()
+        interpreter.invoke()
+        times.append(time.perf_counter() - start)
+    return np.median(times)
+
+
+def main():
+    invokes = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    config = inference.load_config()
+    print('runtime:', inference.runtime)
+
+    for model in MODELS:
+        print()
+        print(model)
+        results = []
+        for num_threads in thread_counts():
+            for xnnpack in (True, False):
+                try:
+                    interpreter = inference.load_interpreter(model, num_threads, xnnpack)
+                except (RuntimeError, ValueError) as e:
+                    print('  threads %d, xnnpack %s: failed (%s)' % (num_threads, xnnpack, e))
+                    continue
+                seconds = time_invokes(interpreter, invokes)
+                # free this copy of the model before the next one is loaded, two copies of
+                # the intent model do not fit next to each other on a 1 GB device
+                del interpreter
+                gc.collect()
+                results.append((seconds, num_threads, xnnpack))
+                print('  threads %d, xnnpack %-5s: %.2f ms' % (num_threads, xnnpack, seconds * 1000))
+
+        if results:
+            seconds, num_threads, xnnpack = min(results)
+            config.setdefault(model, {}).update({'num_threads': num_threads, 'xnnpack': xnnpack})
+            print('  fastest: threads %d, xnnpack %s' % (num_threads, xnnpack))
+
+    inference.save_config(config)
+    print()
+    print('saved to', inference.config_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,790 @@
+""" English date and time extraction for the alarm skill. Vocabulary is looked up in
+    the module level tables below instead of being rebuilt on every call, the
+    utterance is cleaned and split in one pass, and the date pass only looks at
+    words whose token class can start a date expression """
+
+from datetime import datetime, time, timedelta
+from functools import lru_cache
+from dateutil.relativedelta import relativedelta
+from utils.parsers import is_numeric
+
+TIME_QUALIFIERS_AM = frozenset(['morning'])
+TIME_QUALIFIERS_PM = frozenset(['afternoon', 'evening', 'night', 'tonight'])
+TIME_QUALIFIERS = TIME_QUALIFIERS_AM | TIME_QUALIFIERS_PM
+YEAR_MARKERS = frozenset(['in', 'on', 'of'])
+MARKERS = YEAR_MARKERS | frozenset(['at', 'by', 'this', 'around', 'for', 'within'])
+DAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+MONTHS = ['january', 'february', 'march', 'april', 'may', 'june', 'july', 'august',
+          'september', 'october', 'november', 'december']
+MONTHS_SHORT = ['jan', 'feb', 'mar', 'apr', 'may', 'june', 'july', 'aug', 'sept', 'oct',
+                'nov', 'dec']
+RECUR_MARKERS = frozenset(DAYS + [d + 's' for d in DAYS] +
+                          ['weekend', 'weekday', 'weekends', 'weekdays'])
+YEAR_MULTIPLES = {'decade': 10, 'century': 100, 'millennium': 1000}
+DAY_MULTIPLES = frozenset(['weeks', 'months', 'years'])
+FOLLOWUPS = frozenset(DAYS + MONTHS + MONTHS_SHORT +
+                      ['today', 'tomorrow', 'yesterday', 'next', 'last', 'now', 'this'])
+
+# weekday numbers counted from sunday = 0, except sunday itself is 7
+DAY_NUMBERS = {day: i + 1 for i, day in enumerate(DAYS)}
+MONTH_NAMES = dict(zip(MONTHS_SHORT, MONTHS))
+MONTH_NAMES.update(zip(MONTHS, MONTHS))
+RELATIVE_DAYS = {'today': 0, 'tomorrow': 1, 'yesterday': -1}
+PERIODS = {'next': 1, 'last': -1}
+
+# token classes of the date pass, keyed on words with trailing s's stripped
+AGO, NOW, YEAR_MARKER, COUPLE, QUALIFIER, RELATIVE_DAY, DAY, BEFORE, WEEK, MONTH, YEAR, \
+    WEEKDAY, MONTH_NAME, MONTH_SHORT, FROM = range(15)
+DATE_WORDS = {'ago': AGO, 'now': NOW, '2': COUPLE, 'day': DAY, 'before': BEFORE, 'week': WEEK,
+              'month': MONTH, 'year': YEAR, 'from': FROM, 'after': FROM}
+DATE_WORDS.update(dict.fromkeys(YEAR_MARKERS, YEAR_MARKER))
+DATE_WORDS.update(dict.fromkeys(TIME_QUALIFIERS, QUALIFIER))
+DATE_WORDS.update(dict.fromkeys(RELATIVE_DAYS, RELATIVE_DAY))
+DATE_WORDS.update(dict.fromkeys(DAYS, WEEKDAY))
+DATE_WORDS.update(dict.fromkeys(MONTHS_SHORT, MONTH_SHORT))
+DATE_WORDS.update(dict.fromkeys(MONTHS, MONTH_NAME))
+
+# words the time pass acts on, besides numbers
+TIME_WORDS = frozenset(['noon', 'midnight', 'morning', 'afternoon', 'evening', 'tonight', 'night',
+                        'hour', 'minute', 'second'])
+
+REPLACEMENTS = (
+    ('?', ''), ('.', ''), (',', ''),
+    (' the ', ' '), (' a ', ' '), (' an ', ' '),
+    ("o' clock", "o'clock"), ("o clock", "o'clock"), ("o ' clock", "o'clock"),
+    ("o 'clock", "o'clock"), ("oclock", "o'clock"), ("couple", "2"),
+    ("centuries", "century"), ("decades", "decade"), ("millenniums", "millennium"),
+)
+ORDINALS = ("rd", "st", "nd", "th")
+
+
+@lru_cache(maxsize=1024)
+def normalize_word(word):
+    """drops possessives, and ordinal suffixes of numbers (1st -> 1)"""
+    word = word.replace("'s", "")
+    if word and word[0].isdigit():
+        for ordinal in ORDINALS:
+            # "second" is the only case we should not do this
+            if ordinal in word and "second" not in word:
+                word = word.replace(ordinal, "")
+    return word
+
+
+def clean_words(text):
+    """lowercases the text, drops punctuation and filler words, normalizes spellings
+    of o'clock and returns the words"""
+    s = text.lower()
+    for old, new in REPLACEMENTS:
+        if old in s:
+            s = s.replace(old, new)
+    return [normalize_word(word) for word in s.split()]
+
+
+def extract_datetime_en(text, anchor_date=None, default_time=None):
+    """Extracts a datetime from a string, returns [datetime, the rest of the string]
+    or None if there is no date or time in it"""
+
+    if not anchor_date:
+        anchor_date = datetime.now()
+
+    if text == "":
+        return None
+    default_time = default_time or time(0, 0, 0)
+    found = False
+    daySpecified = False
+    dayOffset = False
+    monthOffset = 0
+    yearOffset = 0
+    today = anchor_date.isoweekday() % 7
+    currentYear = anchor_date.year
+    fromFlag = False
+    datestr = ""
+    hasYear = False
+    timeQualifier = ""
+
+    words = clean_words(text)
+
+    # parse date
+    for idx, word in enumerate(words):
+        if word == "":
+            continue
+
+        # this isn't in clean_words because I don't want to save back to words
+        word = word.rstrip('s')
+        kind = DATE_WORDS.get(word)
+        if kind is None:
+            continue
+
+        wordPrevPrev = words[idx - 2] if idx > 1 else ""
+        wordPrev = words[idx - 1] if idx > 0 else ""
+        wordNext = words[idx + 1] if idx + 1 < len(words) else ""
+        wordNextNext = words[idx + 2] if idx + 2 < len(words) else ""
+
+        start = idx
+        used = 0
+        if kind == AGO:
+            if dayOffset:
+                dayOffset = - dayOffset
+                used += 1
+        elif kind == NOW:
+            if not datestr:
+                resultStr = " ".join(words[idx + 1:])
+                resultStr = ' '.join(resultStr.split())
+                extractedDate = anchor_date.replace(microsecond=0)
+                return [extractedDate, resultStr]
+        elif kind == YEAR_MARKER:
+            if is_numeric(wordNext) and len(wordNext) == 4:
+                yearOffset = int(wordNext) - currentYear
+                used += 2
+                hasYear = True
+        # couple of
+        elif kind == COUPLE:
+            if wordNext == "of" and wordNextNext in YEAR_MULTIPLES:
+                used += 3
+                yearOffset = 2 * YEAR_MULTIPLES[wordNextNext]
+            elif wordNext == "of" and wordNextNext in DAY_MULTIPLES:
+                used += 3
+                if wordNextNext == "years":
+                    yearOffset = 2
+                elif wordNextNext == "months":
+                    monthOffset = 2
+                elif wordNextNext == "weeks":
+                    dayOffset = 2 * 7
+        # save timequalifier for later
+        elif kind == QUALIFIER:
+            timeQualifier = word
+        # parse today, tomorrow, yesterday
+        elif kind == RELATIVE_DAY:
+            if not fromFlag:
+                dayOffset = RELATIVE_DAYS[word]
+                used += 1
+        # parse day before yesterday, day after tomorrow, 5 days
+        elif kind == DAY:
+            if wordNext == "before" and wordNextNext == "yesterday" and not fromFlag:
+                dayOffset = -2
+                used += 3
+            elif (wordNext == "after" and
+                  wordNextNext == "tomorrow" and
+                  not fromFlag and
+                  (not wordPrev or not wordPrev[0].isdigit())):
+                dayOffset = 2
+                used = 3
+                if wordPrev == "the":
+                    start -= 1
+                    used += 1
+            elif wordPrev and wordPrev[0].isdigit():
+                dayOffset += int(wordPrev)
+                start -= 1
+                used = 2
+        elif kind == BEFORE:
+            if wordNext == "yesterday" and not fromFlag:
+                dayOffset = -2
+                used += 2
+        # parse 10 weeks, next week, last week, and the same for months and years
+        elif kind == WEEK:
+            if not fromFlag and wordPrev:
+                if wordPrev[0].isdigit():
+                    dayOffset += int(wordPrev) * 7
+                    start -= 1
+                    used = 2
+                elif wordPrev in PERIODS:
+                    dayOffset = PERIODS[wordPrev] * 7
+                    start -= 1
+                    used = 2
+        elif kind == MONTH:
+            if not fromFlag and wordPrev:
+                if wordPrev[0].isdigit():
+                    monthOffset = int(wordPrev)
+                    start -= 1
+                    used = 2
+                elif wordPrev in PERIODS:
+                    monthOffset = PERIODS[wordPrev]
+                    start -= 1
+                    used = 2
+        elif kind == YEAR:
+            if not fromFlag and wordPrev:
+                if wordPrev[0].isdigit():
+                    yearOffset = int(wordPrev)
+                    start -= 1
+                    used = 2
+                elif wordPrev in PERIODS:
+                    yearOffset = PERIODS[wordPrev]
+                    start -= 1
+                    used = 2
+        # parse Monday, Tuesday, etc., and next Monday,
+        # last Tuesday, etc.
+        elif kind == WEEKDAY:
+            if not fromFlag:
+                dayOffset = DAY_NUMBERS[word] - today
+                used = 1
+                if dayOffset < 0:
+                    dayOffset += 7
+                if wordPrev == "next":
+                    if dayOffset <= 2:
+                        dayOffset += 7
+                    used += 1
+                    start -= 1
+                elif wordPrev == "last":
+                    dayOffset -= 7
+                    used += 1
+                    start -= 1
+        # parse 15 of July, June 20th, Feb 18, 19 of February
+        elif kind == MONTH_NAME or kind == MONTH_SHORT and not fromFlag:
+            used += 1
+            datestr = MONTH_NAMES[word]
+            if wordPrev and (wordPrev[0].isdigit() or
+                             (wordPrev == "of" and wordPrevPrev[0].isdigit())):
+                if wordPrev == "of" and wordPrevPrev[0].isdigit():
+                    datestr += " " + words[idx - 2]
+                    used += 1
+                    start -= 1
+                else:
+                    datestr += " " + wordPrev
+                start -= 1
+                used += 1
+                if wordNext and wordNext[0].isdigit():
+                    datestr += " " + wordNext
+                    used += 1
+                    hasYear = True
+                else:
+                    hasYear = False
+
+            elif wordNext and wordNext[0].isdigit():
+                datestr += " " + wordNext
+                used += 1
+                if wordNextNext and wordNextNext[0].isdigit():
+                    datestr += " " + wordNextNext
+                    used += 1
+                    hasYear = True
+                else:
+                    hasYear = False
+
+            # if no date indicators found, it may not be the month of May
+            # may "i/we" ...
+            # "... may be"
+            elif word == 'may' and wordNext in ['i', 'we', 'be']:
+                datestr = ""
+
+        # parse 5 days from tomorrow, 10 weeks from next thursday,
+        # 2 months from July
+        elif kind == FROM and wordNext in FOLLOWUPS:
+            used = 2
+            fromFlag = True
+            if wordNext == "tomorrow":
+                dayOffset += 1
+            elif wordNext == "yesterday":
+                dayOffset -= 1
+            elif wordNext in DAY_NUMBERS:
+                tmpOffset = DAY_NUMBERS[wordNext] - today
+                used = 2
+                if tmpOffset < 0:
+                    tmpOffset += 7
+                dayOffset += tmpOffset
+            elif wordNextNext and wordNextNext in DAY_NUMBERS:
+                tmpOffset = DAY_NUMBERS[wordNextNext] - today
+                used = 3
+                if wordNext == "next":
+                    if dayOffset <= 2:
+                        tmpOffset += 7
+                    used += 1
+                    start -= 1
+                elif wordNext == "last":
+                    tmpOffset -= 7
+                    used += 1
+                    start -= 1
+                dayOffset += tmpOffset
+        if used > 0:
+            if start - 1 > 0 and words[start - 1] == "this":
+                start -= 1
+                used += 1
+
+            for i in range(0, used):
+                words[i + start] = ""
+
+            if start - 1 >= 0 and words[start - 1] in MARKERS:
+                words[start - 1] = ""
+            found = True
+            daySpecified = True
+
+    # parse time
+    hrOffset = 0
+    minOffset = 0
+    secOffset = 0
+    hrAbs = None
+    minAbs = None
+    military = False
+
+    for idx, word in enumerate(words):
+        if word == "":
+            continue
+        if word not in TIME_WORDS and not word[0].isdigit():
+            continue
+
+        wordPrevPrev = words[idx - 2] if idx > 1 else ""
+        wordPrev = words[idx - 1] if idx > 0 else ""
+        wordNext = words[idx + 1] if idx + 1 < len(words) else ""
+        wordNextNext = words[idx + 2] if idx + 2 < len(words) else ""
+        # parse noon, midnight, morning, afternoon, evening
+        used = 0
+        if word == "noon":
+            hrAbs = 12
+            used += 1
+        elif word == "midnight":
+            hrAbs = 0
+            used += 1
+        elif word == "morning":
+            if hrAbs is None:
+                hrAbs = 8
+            used += 1
+        elif word == "afternoon":
+            if hrAbs is None:
+                hrAbs = 15
+            used += 1
+        elif word == "evening":
+            if hrAbs is None:
+                hrAbs = 19
+            used += 1
+        elif word == "tonight" or word == "night":
+            if hrAbs is None:
+                hrAbs = 22
+            # used += 1 ## NOTE this breaks other tests, TODO refactor me!
+
+        # couple of time_unit
+        elif word == "2" and wordNext == "of" and \
+                wordNextNext in ["hours", "minutes", "seconds"]:
+            used += 3
+            if wordNextNext == "hours":
+                hrOffset = 2
+            elif wordNextNext == "minutes":
+                minOffset = 2
+            elif wordNextNext == "seconds":
+                secOffset = 2
+        # parse half an hour, quarter hour
+        elif word == "hour" and \
+                (wordPrev in MARKERS or wordPrevPrev in MARKERS):
+            if wordPrev == "half":
+                minOffset = 30
+            elif wordPrev == "quarter":
+                minOffset = 15
+            elif wordPrevPrev == "quarter":
+                minOffset = 15
+                if idx > 2 and words[idx - 3] in MARKERS:
+                    words[idx - 3] = ""
+                words[idx - 2] = ""
+            elif wordPrev == "within":
+                hrOffset = 1
+            else:
+                hrOffset = 1
+            if wordPrevPrev in MARKERS:
+                words[idx - 2] = ""
+                if wordPrevPrev == "this":
+                    daySpecified = True
+            words[idx - 1] = ""
+            used += 1
+            hrAbs = -1
+            minAbs = -1
+            # parse 5:00 am, 12:00 p.m., etc
+        # parse in a minute
+        elif word == "minute" and wordPrev == "in":
+            minOffset = 1
+            words[idx - 1] = ""
+            used += 1
+        # parse in a second
+        elif word == "second" and wordPrev == "in":
+            secOffset = 1
+            words[idx - 1] = ""
+            used += 1
+        elif word[0].isdigit():
+            isTime = True
+            strHH = ""
+            strMM = ""
+            remainder = ""
+            wordNextNextNext = words[idx + 3] \
+                if idx + 3 < len(words) else ""
+            if wordNext == "tonight" or wordNextNext == "tonight" or \
+                    wordPrev == "tonight" or wordPrevPrev == "tonight" or \
+                    wordNextNextNext == "tonight":
+                remainder = "pm"
+                used += 1
+                if wordPrev == "tonight":
+                    words[idx - 1] = ""
+                if wordPrevPrev == "tonight":
+                    words[idx - 2] = ""
+                if wordNextNext == "tonight":
+                    used += 1
+                if wordNextNextNext == "tonight":
+                    used += 1
+
+            if ':' in word:
+                # parse colons
+                # "3:00 in the morning"
+                stage = 0
+                length = len(word)
+                for i in range(length):
+                    if stage == 0:
+                        if word[i].isdigit():
+                            strHH += word[i]
+                        elif word[i] == ":":
+                            stage = 1
+                        else:
+                            stage = 2
+                            i -= 1
+                    elif stage == 1:
+                        if word[i].isdigit():
+                            strMM += word[i]
+                        else:
+                            stage = 2
+                            i -= 1
+                    elif stage == 2:
+                        remainder = word[i:].replace(".", "")
+                        break
+                if remainder == "":
+                    nextWord = wordNext.replace(".", "")
+                    if nextWord == "am" or nextWord == "pm":
+                        remainder = nextWord
+                        used += 1
+
+                    elif wordNext == "in" and wordNextNext == "the" and \
+                            words[idx + 3] == "morning":
+                        remainder = "am"
+                        used += 3
+                    elif wordNext == "in" and wordNextNext == "the" and \
+                            words[idx + 3] == "afternoon":
+                        remainder = "pm"
+                        used += 3
+                    elif wordNext == "in" and wordNextNext == "the" and \
+                            words[idx + 3] == "evening":
+                        remainder = "pm"
+                        used += 3
+                    elif wordNext == "in" and wordNextNext == "morning":
+                        remainder = "am"
+                        used += 2
+                    elif wordNext == "in" and wordNextNext == "afternoon":
+                        remainder = "pm"
+                        used += 2
+                    elif wordNext == "in" and wordNextNext == "evening":
+                        remainder = "pm"
+                        used += 2
+                    elif wordNext == "this" and wordNextNext == "morning":
+                        remainder = "am"
+                        used = 2
+                        daySpecified = True
+                    elif wordNext == "this" and wordNextNext == "afternoon":
+                        remainder = "pm"
+                        used = 2
+                        daySpecified = True
+                    elif wordNext == "this" and wordNextNext == "evening":
+                        remainder = "pm"
+                        used = 2
+                        daySpecified = True
+                    elif wordNext == "at" and wordNextNext == "night":
+                        if strHH and int(strHH) > 5:
+                            remainder = "pm"
+                        else:
+                            remainder = "am"
+                        used += 2
+
+                    else:
+                        if timeQualifier != "":
+                            military = True
+                            if strHH and int(strHH) <= 12 and \
+                                    (timeQualifier in TIME_QUALIFIERS_PM):
+                                strHH += str(int(strHH) + 12)
+
+            else:
+                # try to parse numbers without colons
+                # 5 hours, 10 minutes etc.
+                length = len(word)
+                strNum = ""
+                remainder = ""
+                for i in range(length):
+                    if word[i].isdigit():
+                        strNum += word[i]
+                    else:
+                        remainder += word[i]
+
+                if remainder == "":
+                    remainder = wordNext.replace(".", "").lstrip().rstrip()
+                if (
+                        remainder == "pm" or
+                        wordNext == "pm" or
+                        remainder == "p.m." or
+                        wordNext == "p.m."):
+                    strHH = strNum
+                    remainder = "pm"
+                    used = 1
+                elif (
+                        remainder == "am" or
+                        wordNext == "am" or
+                        remainder == "a.m." or
+                        wordNext == "a.m."):
+                    strHH = strNum
+                    remainder = "am"
+                    used = 1
+                elif (
+                        remainder in RECUR_MARKERS or
+                        wordNext in RECUR_MARKERS or
+                        wordNextNext in RECUR_MARKERS):
+                    # Ex: "7 on mondays" or "3 this friday"
+                    # Set strHH so that isTime == True
+                    # when am or pm is not specified
+                    strHH = strNum
+                    used = 1
+                else:
+                    if (
+                            int(strNum) > 100 and
+                            (
+                                wordPrev == "o" or
+                                wordPrev == "oh"
+                            )):
+                        # 0800 hours (pronounced oh-eight-hundred)
+                        strHH = str(int(strNum) // 100)
+                        strMM = str(int(strNum) % 100)
+                        military = True
+                        if wordNext == "hours":
+                            used += 1
+                    elif (
+                            (wordNext == "hours" or wordNext == "hour" or
+                            remainder == "hours" or remainder == "hour") and
+                            word[0] != '0' and
+                            (
+                                int(strNum) < 100 or
+                                int(strNum) > 2400
+                            )):
+                        # ignores military time
+                        # "in 3 hours"
+                        hrOffset = int(strNum)
+                        used = 2
+                        isTime = False
+                        hrAbs = -1
+                        minAbs = -1
+
+                    elif wordNext == "minutes" or wordNext == "minute" or \
+                            remainder == "minutes" or remainder == "minute":
+                        # "in 10 minutes"
+                        minOffset = int(strNum)
+                        used = 2
+                        isTime = False
+                        hrAbs = -1
+                        minAbs = -1
+                    elif wordNext == "seconds" or wordNext == "second" \
+                            or remainder == "seconds" or remainder == "second":
+                        # in 5 seconds
+                        secOffset = int(strNum)
+                        used = 2
+                        isTime = False
+                        hrAbs = -1
+                        minAbs = -1
+                    elif int(strNum) > 100:
+                        # military time, eg. "3300 hours"
+                        strHH = str(int(strNum) // 100)
+                        strMM = str(int(strNum) % 100)
+                        military = True
+                        if wordNext == "hours" or wordNext == "hour" or \
+                                remainder == "hours" or remainder == "hour":
+                            used += 1
+                    elif wordNext and wordNext[0].isdigit():
+                        # military time, e.g. "04 38 hours"
+                        strHH = strNum
+                        strMM = wordNext
+                        military = True
+                        used += 1
+                        if (wordNextNext == "hours" or
+                                wordNextNext == "hour" or
+                                remainder == "hours" or remainder == "hour"):
+                            used += 1
+                    elif (
+                            wordNext == "" or wordNext == "o'clock" or
+                            (
+                                wordNext == "in" and
+                                (
+                                        wordNextNext == "the" or
+                                        wordNextNext == timeQualifier
+                                )
+                            ) or wordNext == 'tonight' or
+                            wordNextNext == 'tonight'):
+
+                        strHH = strNum
+                        strMM = "00"
+                        if wordNext == "o'clock":
+                            used += 1
+
+                        if wordNext == "in" or wordNextNext == "in":
+                            used += (1 if wordNext == "in" else 2)
+                            wordNextNextNext = words[idx + 3] \
+                                if idx + 3 < len(words) else ""
+
+                            if (wordNextNext and
+                                    (wordNextNext in timeQualifier or
+                                    wordNextNextNext in timeQualifier)):
+                                if (wordNextNext in TIME_QUALIFIERS_PM or
+                                        wordNextNextNext in TIME_QUALIFIERS_PM):
+                                    remainder = "pm"
+                                    used += 1
+                                if (wordNextNext in TIME_QUALIFIERS_AM or
+                                        wordNextNextNext in TIME_QUALIFIERS_AM):
+                                    remainder = "am"
+                                    used += 1
+
+                        if timeQualifier != "":
+                            if timeQualifier in TIME_QUALIFIERS_PM:
+                                remainder = "pm"
+                                used += 1
+
+                            elif timeQualifier in TIME_QUALIFIERS_AM:
+                                remainder = "am"
+                                used += 1
+                            else:
+                                # TODO: Unsure if this is 100% accurate
+                                used += 1
+                                military = True
+                    else:
+                        isTime = False
+            HH = int(strHH) if strHH else 0
+            MM = int(strMM) if strMM else 0
+            HH = HH + 12 if remainder == "pm" and HH < 12 else HH
+            HH = HH - 12 if remainder == "am" and HH >= 12 else HH
+
+            if (not military and
+                    remainder not in ['am', 'pm', 'hours', 'minutes',
+                                    "second", "seconds",
+                                    "hour", "minute"] and
+                    ((not daySpecified) or 0 <= dayOffset < 1)):
+
+                # ambiguous time, detect whether they mean this evening or
+                # the next morning based on whether it has already passed
+                if anchor_date.hour < HH or (anchor_date.hour == HH and
+                                            anchor_date.minute < MM):
+                    pass  # No modification needed
+                elif anchor_date.hour < HH + 12:
+                    HH += 12
+                else:
+                    # has passed, assume the next morning
+                    dayOffset += 1
+
+            if timeQualifier in TIME_QUALIFIERS_PM and HH < 12:
+                HH += 12
+
+            if HH > 24 or MM > 59:
+                isTime = False
+                used = 0
+            if isTime:
+                hrAbs = HH
+                minAbs = MM
+                used += 1
+
+        if used > 0:
+            # removed parsed words from the sentence
+            for i in range(used):
+                if idx + i >= len(words):
+                    break
+                words[idx + i] = ""
+
+            if wordPrev == "o" or wordPrev == "oh":
+                words[words.index(wordPrev)] = ""
+
+            if wordPrev == "early":
+                hrOffset = -1
+                words[idx - 1] = ""
+                idx -= 1
+            elif wordPrev == "late":
+                hrOffset = 1
+                words[idx - 1] = ""
+                idx -= 1
+            if idx > 0 and wordPrev in MARKERS:
+                words[idx - 1] = ""
+                if wordPrev == "this":
+                    daySpecified = True
+            if idx > 1 and wordPrevPrev in MARKERS:
+                words[idx - 2] = ""
+                if wordPrevPrev == "this":
+                    daySpecified = True
+
+            idx += used - 1
+            found = True
+    # check that we found a date
+    if not (found or datestr != "" or yearOffset != 0 or monthOffset != 0 or
+            dayOffset is True or hrOffset != 0 or hrAbs or minOffset != 0 or
+            minAbs or secOffset != 0):
+        return None
+
+    if dayOffset is False:
+        dayOffset = 0
+
+    # perform date manipulation
+
+    extractedDate = anchor_date.replace(microsecond=0)
+
+    if datestr != "":
+        # date included an explicit date, e.g. "june 5" or "june 2, 2017"
+        try:
+            temp = datetime.strptime(datestr, "%B %d")
+        except ValueError:
+            # Try again, allowing the year
+            temp = datetime.strptime(datestr, "%B %d %Y")
+        extractedDate = extractedDate.replace(hour=0, minute=0, second=0)
+        if not hasYear:
+            temp = temp.replace(year=extractedDate.year,
+                                tzinfo=extractedDate.tzinfo)
+            if extractedDate < temp:
+                extractedDate = extractedDate.replace(
+                    year=currentYear,
+                    month=temp.month,
+                    day=temp.day,
+                    tzinfo=extractedDate.tzinfo)
+            else:
+                extractedDate = extractedDate.replace(
+                    year=currentYear + 1,
+                    month=temp.month,
+                    day=temp.day,
+                    tzinfo=extractedDate.tzinfo)
+        else:
+            extractedDate = extractedDate.replace(
+                year=temp.year,
+                month=temp.month,
+                day=temp.day,
+                tzinfo=extractedDate.tzinfo)
+    else:
+        # ignore the current HH:MM:SS if relative using days or greater
+        if hrOffset == 0 and minOffset == 0 and secOffset == 0:
+            extractedDate = extractedDate.replace(hour=default_time.hour,
+                                                minute=default_time.minute,
+                                                second=default_time.second)
+
+    if yearOffset != 0:
+        extractedDate = extractedDate + relativedelta(years=yearOffset)
+    if monthOffset != 0:
+        extractedDate = extractedDate + relativedelta(months=monthOffset)
+    if dayOffset != 0:
+        extractedDate = extractedDate + timedelta(days=dayOffset)
+    if hrOffset != 0:
+        extractedDate = extractedDate + timedelta(hours=hrOffset)
+    if minOffset != 0:
+        extractedDate = extractedDate + timedelta(minutes=minOffset)
+    if secOffset != 0:
+        extractedDate = extractedDate + timedelta(seconds=secOffset)
+
+    if hrAbs != -1 and minAbs != -1 and not hrOffset and not minOffset and not secOffset:
+        # If no time was supplied in the string set the time to default
+        # time if it's available
+        if hrAbs is None and minAbs is None and default_time is not None:
+            hrAbs, minAbs = default_time.hour, default_time.minute
+        else:
+            hrAbs = hrAbs or 0
+            minAbs = minAbs or 0
+
+        extractedDate = extractedDate.replace(hour=hrAbs,
+                                            minute=minAbs)
+
+        if (hrAbs != 0 or minAbs != 0) and datestr == "":
+            if not daySpecified and anchor_date > extractedDate:
+                extractedDate = extractedDate + timedelta(days=1)
+
+    for idx, word in enumerate(words):
+        if words[idx] == "and" and \
+                words[idx - 1] == "" and words[idx + 1] == "":
+            words[idx] = ""
+
+    resultStr = " ".join(words)
+    resultStr = ' '.join(resultStr.split())
+    return [extractedDate, resultStr]
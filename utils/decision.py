@@ -0,0 +1,73 @@
+""" Turns the stream of per-window wake word scores into trigger decisions """
+
+from collections import deque
+import time
+
+
+class WakeWordDecision:
+    """Decides when a detection should wake up the rest of willow.
+
+    Scores are smoothed with a moving average over `smoothing` windows, a window
+    votes for willow when its smoothed score is above the threshold, and a trigger
+    needs `votes` of the last `window_count` votes. After a trigger no other trigger
+    can happen for `refractory` seconds, measured on `clock` (real time unless
+    recordings are replayed faster than that). The defaults (no smoothing, 1 of 1 votes)
+    trigger on any window above the threshold, like the engine always has"""
+
+    def __init__(self, threshold, smoothing=1, votes=1, window_count=1, refractory=2.0,
+                 clock=time.monotonic):
+        self.threshold = threshold
+        self.votes = votes
+        self.refractory = refractory
+        self.clock = clock
+
+        self.scores = deque(maxlen=smoothing)
+        self.history = deque(maxlen=window_count)
+        self.last_trigger = None    # clock time of the last trigger
+
+        # a run of raw scores above the threshold is one would-be pipeline run
+        self.in_spike = False
+        self.spike_triggered = False
+
+        self.triggers = 0
+        self.suppressed = 0
+
+    def reset(self, keep_refractory=True):
+        """start a new stream, counters are kept. A refractory period that is still
+        running carries over into the new stream (the live loop restarts the stream
+        right after every trigger), unless keep_refractory is False"""
+        self.end_spike()
+        self.scores.clear()
+        self.history.clear()
+        if not keep_refractory:
+            self.last_trigger = None
+
+    def end_spike(self):
+        if self.in_spike and not self.spike_triggered:
+            self.suppressed += 1
+        self.in_spike = False
+
+    def update(self, score):
+        """returns True if willow should be considered detected after this window"""
+        self.scores.append(score)
+        smoothed = sum(self.scores) / len(self.scores)
+        self.history.append(smoothed > self.threshold)
+
+        if score > self.threshold:
+            if not self.in_spike:
+                self.in_spike = True
+                self.spike_triggered = False
+        else:
+            self.end_spike()
+
+        now = self.clock()
+        if self.last_trigger is not None and now - self.last_trigger < self.refractory:
+            return False
+        if sum(self.history) < self.votes:
+            return False
+
+        self.triggers += 1
+        self.spike_triggered = True
+        self.last_trigger = now
+        self.history.clear()
+        return True
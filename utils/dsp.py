@@ -0,0 +1,123 @@
+""" Streaming signal processing blocks used by the wake word engine. Each block keeps
+    whatever state it needs between calls so that audio can be fed in one recording
+    at a time without edge effects at the block boundaries """
+
+import numpy as np
+from scipy.signal import ellip, sosfilt
+
+
+class Decimator:
+    """Downsamples a stream by an integer factor, with a windowed sinc anti-alias
+    filter whose history is carried over from one block to the next"""
+
+    def __init__(self, in_rate, out_rate, num_taps=31):
+        if in_rate % out_rate:
+            raise ValueError('input rate must be a multiple of the output rate')
+        self.factor = in_rate // out_rate
+
+        # low pass just below the new nyquist frequency
+        cutoff = 0.9 * 0.5 / self.factor
+        n = np.arange(num_taps) - (num_taps - 1) / 2
+        taps = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(num_taps)
+        self.taps = taps / taps.sum()
+
+        self.history = num_taps - 1
+        self.buffer = np.zeros(self.history)
+        self.phase = 0
+
+    def reset(self):
+        """start a new stream"""
+        self.buffer[:] = 0
+        self.phase = 0
+
+    def process(self, block):
+        """returns the downsampled block"""
+        n = len(block)
+        if len(self.buffer) != self.history + n:
+            history = self.buffer[:self.history]
+            self.buffer = np.concatenate((history, np.zeros(n)))
+
+        self.buffer[self.history:] = block
+        filtered = np.convolve(self.buffer, self.taps, 'valid')
+        out = filtered[self.phase::self.factor]
+
+        # keep the end of this block for the next one and stay aligned to the output grid
+        self.buffer[:self.history] = self.buffer[n:]
+        self.phase = (self.phase - n) % self.factor
+        return out
+
+
+class HighPassFilter:
+    """Streaming high pass filter. A steep elliptic filter (cascaded biquads) stands in
+    for the brick wall the wake word model was trained with: 120 dB down in the stop
+    band keeps the low mel bands of the mfccs close to what a full window FFT mask
+    leaves in them"""
+
+    def __init__(self, rate, cutoff=200, order=12, ripple=0.1, attenuation=120):
+        self.sos = ellip(order, ripple, attenuation, cutoff, 'highpass', fs=rate, output='sos')
+        self.state = np.zeros((self.sos.shape[0], 2))
+
+    def reset(self):
+        """start a new stream"""
+        self.state[:] = 0
+
+    def process(self, block):
+        """returns the filtered block"""
+        out, self.state = sosfilt(self.sos, block, zi=self.state)
+        return out
+
+
+class VoiceActivityGate:
+    """Cheap streaming speech detector used to skip the wake word model on silent audio.
+
+    Every recording is cut into short subframes. A subframe counts as speech if its
+    energy is well above an adaptive noise floor and its zero crossing rate is low
+    enough to rule out broadband hiss. The noise floor follows the quietest subframe
+    of each recording, dropping immediately and rising slowly. Once a recording has
+    speech the gate stays open for `hangover` more recordings, so a word stays
+    visible for as long as it is inside the detection window"""
+
+    def __init__(self, rate, hangover, subframe=0.02, ratio=4.0, min_energy=1e-7,
+                 max_zcr=0.35, min_active=2, rise=0.05):
+        self.subframe_len = int(subframe * rate)
+        self.hangover = hangover
+        self.ratio = ratio
+        self.min_energy = min_energy
+        self.max_zcr = max_zcr
+        self.min_active = min_active
+        self.rise = rise
+
+        self.noise_floor = None
+        self.open_for = 0
+
+    def reset(self):
+        """start a new stream, the noise floor is kept"""
+        self.open_for = 0
+
+    def is_speech(self, block):
+        """returns whether this recording on its own contains speech"""
+        n = len(block) // self.subframe_len * self.subframe_len
+        subframes = block[:n].reshape(-1, self.subframe_len)
+
+        energy = np.mean(np.square(subframes), axis=1)
+        signs = np.signbit(subframes)
+        zcr = np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+
+        quietest = energy.min()
+        if self.noise_floor is None or quietest < self.noise_floor:
+            self.noise_floor = quietest
+        else:
+            self.noise_floor += self.rise * (quietest - self.noise_floor)
+
+        threshold = max(self.noise_floor * self.ratio, self.min_energy)
+        active = np.count_nonzero((energy > threshold) & (zcr < self.max_zcr))
+        return active >= self.min_active
+
+    def update(self, block):
+        """returns whether the window ending with this recording may contain speech"""
+        if self.is_speech(block):
+            self.open_for = self.hangover + 1
+        if self.open_for:
+            self.open_for -= 1
+            return True
+        return False
@@ -0,0 +1,85 @@
+""" Spoken durations for the timer skill, e.g. 'twenty five minutes' or 'an hour and a
+    half'. Number words the speech recognizer leaves as words are folded into one
+    number per run ('twenty five' is 25, not 20 and 5) before the units are added up """
+
+import re
+
+UNITS = {'zero': 0, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6,
+         'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10, 'eleven': 11, 'twelve': 12,
+         'thirteen': 13, 'fourteen': 14, 'fifteen': 15, 'sixteen': 16, 'seventeen': 17,
+         'eighteen': 18, 'nineteen': 19}
+TENS = {'twenty': 20, 'thirty': 30, 'forty': 40, 'fifty': 50, 'sixty': 60, 'seventy': 70,
+        'eighty': 80, 'ninety': 90}
+
+# seconds in each unit of a duration, a trailing s is stripped before the lookup
+DURATION_UNITS = {'day': 86400, 'hour': 3600, 'hr': 3600, 'minute': 60, 'min': 60,
+                  'second': 1, 'sec': 1}
+NUMBER = re.compile(r'\d+(\.\d+)?$')
+
+
+def numbers_to_digits(words):
+    """words with every run of number words replaced by its value as digits, e.g.
+    ['one', 'hundred', 'and', 'twenty', 'five'] -> ['125']. A word only joins the run
+    before it where it fills an empty place: units after tens, tens or units after
+    hundred. Otherwise it starts a new number"""
+    out = []
+    value = None        # the number being read
+    last = None         # 'unit', 'ten' or 'hundred', what the number ends with
+    for i, word in enumerate(words):
+        if word in UNITS and (last == 'hundred' or (last == 'ten' and 0 < UNITS[word] < 10)):
+            value += UNITS[word]
+            last = 'unit'
+        elif word in TENS and last == 'hundred':
+            value += TENS[word]
+            last = 'ten'
+        elif word == 'hundred' and last in ('unit', 'ten') and value < 100:
+            value *= 100
+            last = 'hundred'
+        elif word == 'and' and last == 'hundred' and i + 1 < len(words) and \
+                (words[i + 1] in UNITS or words[i + 1] in TENS):
+            continue
+        else:
+            if value is not None:
+                out.append(str(value))
+            value, last = None, None
+            if word in UNITS:
+                value, last = UNITS[word], 'unit'
+            elif word in TENS:
+                value, last = TENS[word], 'ten'
+            elif word == 'hundred':
+                value, last = 100, 'hundred'
+            else:
+                out.append(word)
+    if value is not None:
+        out.append(str(value))
+    return out
+
+
+def parse_duration(text):
+    """seconds in a spoken duration like 'for 1 hour and 10 minutes', 'an hour and a
+    half' or '2 days', None if there is none. The units are added up directly, the
+    date parser would count days to midnight instead of whole days"""
+    words = numbers_to_digits(text.lower().replace('-', ' ').split())
+    seconds = 0
+    amount = None       # said before its unit, 1 for 'a'/'an'
+    counted = False     # the amount is a number, not an article
+    unit = None         # the last unit, a trailing 'and a half' is half of it
+    for word in words + ['']:
+        size = DURATION_UNITS.get(word[:-1] if word.endswith('s') else word)
+        if size is not None:
+            if amount is not None:
+                seconds += amount * size
+                unit = size
+            amount, counted = None, False
+        elif NUMBER.match(word):
+            amount, counted = float(word), True
+        elif word in ('a', 'an'):
+            if amount is None:
+                amount = 1
+        elif word == 'half':
+            amount = amount + 0.5 if counted else 0.5
+        elif word != 'and':
+            if amount == 0.5 and not counted and unit:
+                seconds += 0.5 * unit
+            amount, counted = None, False
+    return seconds if seconds > 0 else None
@@ -0,0 +1,119 @@
+""" Audio feature extraction for the wake word engine """
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def hz2mel(hz):
+    return 2595 * np.log10(1 + hz / 700.)
+
+
+def mel2hz(mel):
+    return 700 * (10 ** (mel / 2595.0) - 1)
+
+
+class MfccFrontend:
+    """Computes mfccs the same way python_speech_features.mfcc does (no preemphasis,
+    no lifter, no energy term), but builds the window, mel filterbank and dct
+    matrices once and computes every frame in one batched pass"""
+
+    def __init__(self, rate, num_mfcc, winlen=0.256, winstep=0.050, nfilt=26, nfft=2048):
+        self.rate = rate
+        self.num_mfcc = num_mfcc
+        self.nfft = nfft
+        self.frame_len = int(round(winlen * rate))
+        self.frame_step = int(round(winstep * rate))
+
+        self.window = np.hanning(self.frame_len)
+        self.fbank = self.filterbanks(nfilt, nfft, rate)
+        self.dct = self.dct_matrix(num_mfcc, nfilt)
+
+        # zero padded copy of the signal, reused while the signal length stays the same
+        self.padded = np.zeros(0)
+
+    @staticmethod
+    def filterbanks(nfilt, nfft, rate):
+        """(nfilt, nfft//2 + 1) triangular mel filterbank between 0 Hz and rate/2"""
+        melpoints = np.linspace(hz2mel(0), hz2mel(rate / 2), nfilt + 2)
+        bins = np.floor((nfft + 1) * mel2hz(melpoints) / rate)
+
+        fbank = np.zeros([nfilt, nfft // 2 + 1])
+        for j in range(nfilt):
+            for i in range(int(bins[j]), int(bins[j + 1])):
+                fbank[j, i] = (i - bins[j]) / (bins[j + 1] - bins[j])
+            for i in range(int(bins[j + 1]), int(bins[j + 2])):
+                fbank[j, i] = (bins[j + 2] - i) / (bins[j + 2] - bins[j + 1])
+        return fbank
+
+    @staticmethod
+    def dct_matrix(numcep, nfilt):
+        """first numcep rows of the orthonormal type 2 dct of size nfilt"""
+        k = np.arange(numcep)[:, None]
+        n = np.arange(nfilt)[None, :]
+        dct = np.sqrt(2.0 / nfilt) * np.cos(np.pi * k * (2 * n + 1) / (2 * nfilt))
+        dct[0] /= np.sqrt(2)
+        return dct
+
+    def num_frames(self, num_samples):
+        """number of frames produced for a signal of num_samples samples"""
+        if num_samples <= self.frame_len:
+            return 1
+        return 1 + int(np.ceil((num_samples - self.frame_len) / self.frame_step))
+
+    def mfcc(self, signal):
+        """mfccs of every frame in signal, one row per frame"""
+        n = len(signal)
+        padlen = (self.num_frames(n) - 1) * self.frame_step + self.frame_len
+
+        if len(self.padded) != padlen:
+            self.padded = np.zeros(padlen)
+        self.padded[:n] = signal
+        self.padded[n:] = 0
+
+        frames = sliding_window_view(self.padded, self.frame_len)[::self.frame_step]
+        spec = np.fft.rfft(frames * self.window, self.nfft)
+        powspec = np.square(np.absolute(spec)) / self.nfft
+
+        feat = powspec @ self.fbank.T
+        feat[feat == 0] = np.finfo(float).eps
+        np.log(feat, out=feat)
+        return feat @ self.dct.T
+
+
+class StreamingMfcc:
+    """Computes the mfccs of a sliding audio window, reusing the frames that were
+    already computed for the previous window and only computing the frames that
+    cover newly arrived samples"""
+
+    def __init__(self, frontend, window_len, hop_len):
+        """window_len and hop_len are in samples"""
+        self.frontend = frontend
+        self.frame_step = frontend.frame_step
+        self.num_frames = frontend.num_frames(window_len)
+
+        # frames only line up between windows if the hop is a whole number of frame steps,
+        # and only frames that were not zero padded at the end of the last window can be kept
+        self.shift = hop_len // self.frame_step
+        self.reuse = 0
+        if hop_len % self.frame_step == 0 and window_len - hop_len - frontend.frame_len >= 0:
+            self.reuse = (window_len - hop_len - frontend.frame_len) // self.frame_step + 1
+
+        # ring of already computed frames, one row per frame
+        self.frames = np.zeros((self.num_frames, frontend.num_mfcc))
+        self.primed = False
+
+    def reset(self):
+        """forget the cached frames, the next update computes the whole window"""
+        self.primed = False
+
+    def update(self, window):
+        """returns the (num_mfcc, frames) mfccs of the window, which must have moved
+        forward by exactly one hop since the last update"""
+        start = 0
+        if self.primed and self.reuse:
+            self.frames[:self.reuse] = self.frames[self.shift:self.shift + self.reuse]
+            start = self.reuse
+
+        self.frames[start:] = self.frontend.mfcc(window[start * self.frame_step:])
+        self.primed = True
+        return self.frames.transpose()
@@ -0,0 +1,90 @@
+""" Loads tflite models with the lightest runtime available. The standalone
+    tflite_runtime package is used when it is installed (it imports in a fraction of
+    the time and memory full tensorflow needs), otherwise tf.lite. Per model thread
+    counts, XNNPACK settings and the model variant (float, or one of the quantized
+    files tools/quantize_models.py writes next to it) come from
+    things/inference_config.json, which tools/tune_inference.py writes """
+
+import json
+import os
+
+try:
+    from tflite_runtime.interpreter import Interpreter, OpResolverType
+    runtime = 'tflite_runtime'
+except ImportError:
+    import tensorflow as tf
+    Interpreter = tf.lite.Interpreter
+    OpResolverType = tf.lite.experimental.OpResolverType
+    runtime = 'tensorflow'
+
+config_path = 'things/inference_config.json'
+variants = ['float', 'dynamic', 'int8']
+
+
+def load_config():
+    """returns {model path: {'num_threads': int, 'xnnpack': bool, 'variant': str}}. The
+    intent model can also have 'idle_unload', seconds after which utils/models.py
+    unloads it, and 'buckets', the input lengths willow.py runs it at"""
+    if not os.path.exists(config_path):
+        return {}
+    with open(config_path) as f:
+        return json.load(f)
+
+
+def save_config(config):
+    with open(config_path, 'w') as f:
+        json.dump(config, f, indent=4)
+
+
+def variant_path(model_path, variant):
+    """path of a quantized variant of a model, e.g. models/model_int8.tflite"""
+    if variant == 'float':
+        return model_path
+    if variant not in variants:
+        raise ValueError('unknown model variant ' + variant)
+    base, ext = os.path.splitext(model_path)
+    return base + '_' + variant + ext
+
+
+def warm_up(interpreter):
+    """Runs one invoke on zeroed inputs. The first invoke of an interpreter is much slower
+    than the rest (the delegate prepares its kernels and packs the weights), this moves
+    that cost from the first real request to load time"""
+    for detail in interpreter.get_input_details():
+        interpreter.tensor(detail['index'])().fill(0)
+    interpreter.invoke()
+
+
+def load_interpreter(model_path, num_threads=None, xnnpack=None, variant=None, input_shape=None):
+    """Returns an interpreter with allocated tensors that has been warmed up. Options
+    that are not given are taken from the tuned configuration, defaulting to the
+    float model on the runtime's thread count with the XNNPACK delegate on.
+    input_shape resizes the first input before the tensors are allocated, which
+    raises RuntimeError or ValueError if the model can not run at that shape"""
+    settings = load_config().get(model_path, {})
+    if num_threads is None:
+        num_threads = settings.get('num_threads')
+    if xnnpack is None:
+        xnnpack = settings.get('xnnpack', True)
+    if variant is None:
+        variant = settings.get('variant', 'float')
+
+    path = variant_path(model_path, variant)
+    if not os.path.exists(path):
+        print('[WARNING]', path, 'not found, using', model_path)
+        path = model_path
+
+    # AUTO applies the default delegates, which is XNNPACK for float models
+    if xnnpack:
+        resolver = OpResolverType.AUTO
+    else:
+        resolver = OpResolverType.BUILTIN_WITHOUT_DEFAULT_DELEGATES
+
+    interpreter = Interpreter(model_path=path,
+                              num_threads=num_threads,
+                              experimental_op_resolver_type=resolver)
+    if input_shape is not None:
+        interpreter.resize_tensor_input(interpreter.get_input_details()[0]['index'], input_shape)
+    interpreter.allocate_tensors()
+    warm_up(interpreter)
+    return interpreter
@@ -0,0 +1,80 @@
+""" Shared registry of the models willow uses. A model is loaded the first time it is
+    asked for (or ahead of time by warm_up on a background thread), every caller
+    gets the same instance, and models registered with idle_unload are dropped again
+    once they have not been used for that many seconds """
+
+import gc
+import threading
+import time
+from utils.timing_wheel import TimingWheel
+
+
+class ModelEntry:
+    def __init__(self, loader, idle_unload=None):
+        self.loader = loader
+        self.idle_unload = idle_unload
+        self.model = None
+        self.lock = threading.Lock()    # held while loading or unloading
+        self.timer = None               # idle timer on the registry's timing wheel
+        self.uses = 0                   # counts gets, tells a stale idle timer apart
+
+
+class ModelRegistry:
+    """Lazily loaded, shared models by name"""
+
+    def __init__(self):
+        self.entries = {}
+        self.wheel = None
+
+    def register(self, name, loader, idle_unload=None):
+        """loader() builds the model, idle_unload is in seconds, None keeps it loaded"""
+        self.entries[name] = ModelEntry(loader, idle_unload)
+        if idle_unload is not None and self.wheel is None:
+            self.wheel = TimingWheel(tick=1.0)
+
+    def get(self, name):
+        """returns the model, loading it first if needed. Callers may keep using the
+        instance they got even if the registry unloads it meanwhile"""
+        entry = self.entries[name]
+        with entry.lock:
+            if entry.model is None:
+                start = time.perf_counter()
+                entry.model = entry.loader()
+                print('[INFO] loaded', name, 'model in %.2f s' % (time.perf_counter() - start))
+            model = entry.model
+            self.restart_idle_timer(name, entry)
+        return model
+
+    def loaded(self, name):
+        return self.entries[name].model is not None
+
+    def warm_up(self, name):
+        """starts loading a model in the background so the next get does not wait as long"""
+        if not self.loaded(name):
+            threading.Thread(target=self.get, args=(name,), daemon=True).start()
+
+    def unload(self, name, uses=None):
+        """drops the model. The idle timer passes the use count it was started at, and
+        nothing happens if the model was used since"""
+        entry = self.entries[name]
+        with entry.lock:
+            if uses is not None and uses != entry.uses:
+                return
+            if entry.timer is not None:
+                self.wheel.cancel(entry.timer)
+                entry.timer = None
+            if entry.model is not None:
+                entry.model = None
+                gc.collect()
+                print('[INFO] unloaded', name, 'model')
+
+    def restart_idle_timer(self, name, entry):
+        if entry.idle_unload is None:
+            return
+        entry.uses += 1
+        if entry.timer is not None:
+            self.wheel.cancel(entry.timer)
+        entry.timer = self.wheel.schedule(entry.idle_unload, self.unload, name, entry.uses)
+
+
+registry = ModelRegistry()
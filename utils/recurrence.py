@@ -0,0 +1,77 @@
+""" Weekly recurrence of alarms. The days an alarm repeats on are kept as a bitmask
+    over weekdays numbered from sunday = 0 (the numbering alarms are saved with), and
+    occurrences are computed from tables built once at import instead of stepping
+    through the calendar one day at a time """
+
+from datetime import timedelta
+
+# weekdays in each mask, in order
+MASK_DAYS = [tuple(d for d in range(7) if mask >> d & 1) for mask in range(128)]
+
+# days from weekday w to the first weekday in the mask, 0 if w is in it itself
+GAPS = [[min([(d - w) % 7 for d in days], default=None) for w in range(7)] for days in MASK_DAYS]
+
+
+def to_mask(days):
+    """bitmask of a set of weekday strings like {'1', '3'}"""
+    mask = 0
+    for day in days:
+        mask |= 1 << int(day)
+    return mask
+
+
+def weekday(day):
+    """weekday of a date counted from sunday = 0"""
+    return day.isoweekday() % 7
+
+
+class Recurrence:
+    """A set of weekdays an alarm repeats on, optionally until (not including) a date"""
+
+    def __init__(self, days, until=None):
+        self.mask = days if isinstance(days, int) else to_mask(days)
+        self.days = MASK_DAYS[self.mask]
+        self.until = until
+
+    def nth(self, start, n=0):
+        """the n-th (from 0) occurrence on or after the date start, None if there is none
+        before until"""
+        if not self.days:
+            return None
+        first = start + timedelta(days=GAPS[self.mask][weekday(start)])
+        k = len(self.days)
+        p = self.days.index(weekday(first))
+        day = first + timedelta(days=7 * ((p + n) // k) + self.days[(p + n) % k] - self.days[p])
+        if self.until and day >= self.until:
+            return None
+        return day
+
+    def first(self, start):
+        """the first occurrence on or after start"""
+        return self.nth(start, 0)
+
+    def next(self, start, count):
+        """up to count occurrences on or after start"""
+        days = []
+        for n in range(count):
+            day = self.nth(start, n)
+            if day is None:
+                break
+            days.append(day)
+        return days
+
+    def count(self, start, end):
+        """number of occurrences from start up to (not including) end"""
+        if self.until and self.until < end:
+            end = self.until
+        total = (end - start).days
+        if total <= 0:
+            return 0
+        weeks, rest = divmod(total, 7)
+        w = weekday(start)
+        return weeks * len(self.days) + sum(self.mask >> ((w + i) % 7) & 1 for i in range(rest))
+
+    def between(self, start, end):
+        """yields the occurrences from start up to (not including) end, one at a time"""
+        for n in range(self.count(start, end)):
+            yield self.nth(start, n)
@@ -0,0 +1,183 @@
+""" A hierarchical timing wheel. Time is counted in ticks of `tick` seconds and every
+    level has 64 slots, each level's slots being 64 times as wide as the level
+    below. A timer goes into the lowest level whose span covers its deadline and
+    moves down a level each time the slot it is in comes up, so adding and
+    cancelling a timer are O(1) however many are running. A bitmask of the occupied
+    slots of each level gives the next tick that has work to do, and the driver
+    thread sleeps until exactly then instead of waking up on every tick """
+
+import threading
+import time
+
+SLOT_BITS = 6
+SLOTS = 1 << SLOT_BITS
+SLOT_MASK = SLOTS - 1
+DUE = -1
+
+
+class WheelTimer:
+    """Handle of a scheduled callback, pass it to TimingWheel.cancel to stop it"""
+
+    __slots__ = ('deadline', 'expires', 'callback', 'args', 'level', 'index')
+
+    def __init__(self, deadline, expires, callback, args):
+        self.deadline = deadline    # time.monotonic() the timer is due at
+        self.expires = expires      # tick the timer fires on
+        self.callback = callback
+        self.args = args
+        self.level = None           # where the timer is: level and slot index, DUE when it is
+        self.index = None           # about to fire and None once it fired or was cancelled
+
+
+class TimingWheel:
+    """Runs callbacks at monotonic deadlines on a background thread. With the default
+    10 ms tick the five levels cover 124 days, later timers wait in the top level"""
+
+    def __init__(self, tick=0.01, levels=5):
+        self.tick = tick
+        self.levels = levels
+        self.slots = [[set() for _ in range(SLOTS)] for _ in range(levels)]
+        self.occupied = [0] * levels
+        self.due = set()
+
+        self.start_time = time.monotonic()
+        self.current = 0    # last tick that was processed
+        self.cond = threading.Condition()
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def __len__(self):
+        with self.cond:
+            return sum(len(slot) for level in self.slots for slot in level) + len(self.due)
+
+    def schedule(self, delay, callback, *args):
+        """calls callback(*args) delay seconds from now, returns the timer's handle"""
+        return self.schedule_at(time.monotonic() + delay, callback, *args)
+
+    def schedule_at(self, deadline, callback, *args):
+        """calls callback(*args) at the time.monotonic() deadline"""
+        # round up so a timer never fires early
+        expires = -int(-(deadline - self.start_time) // self.tick)
+        timer = WheelTimer(deadline, expires, callback, args)
+        with self.cond:
+            self.insert(timer)
+            self.cond.notify()
+        return timer
+
+    def cancel(self, timer):
+        """stops a timer, returns False if it already fired or was cancelled"""
+        with self.cond:
+            if timer.level is None:
+                return False
+            if timer.level == DUE:
+                self.due.discard(timer)
+            else:
+                slot = self.slots[timer.level][timer.index]
+                slot.discard(timer)
+                if not slot:
+                    self.occupied[timer.level] &= ~(1 << timer.index)
+            timer.level = None
+            return True
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        self.thread.join()
+
+    def insert(self, timer):
+        delta = timer.expires - self.current
+        if delta <= 0:
+            self.due.add(timer)
+            timer.level = DUE
+            return
+
+        # lowest level that spans the deadline, the top level holds everything later
+        level = 0
+        while level < self.levels - 1 and delta >= SLOTS ** (level + 1):
+            level += 1
+        expires = min(timer.expires, self.current + SLOTS ** self.levels - 1)
+        index = (expires >> (SLOT_BITS * level)) & SLOT_MASK
+
+        self.slots[level][index].add(timer)
+        timer.level = level
+        timer.index = index
+        self.occupied[level] |= 1 << index
+
+    def next_tick(self):
+        """first tick after the current one that fires or cascades a slot, None if there
+        are no timers"""
+        best = None
+        for level in range(self.levels):
+            mask = self.occupied[level]
+            if not mask:
+                continue
+            shift = SLOT_BITS * level
+            block = self.current >> shift
+            # rotate the mask so bit 0 is the slot of the next block
+            start = (block + 1) & SLOT_MASK
+            rotated = ((mask >> start) | (mask << (SLOTS - start))) & ((1 << SLOTS) - 1)
+            steps = (rotated & -rotated).bit_length()
+            tick = (block + steps) << shift
+            if best is None or tick < best:
+                best = tick
+        return best
+
+    def advance(self, now_tick):
+        """processes every tick up to now_tick, returns the timers that are due"""
+        while True:
+            tick = self.next_tick()
+            if tick is None or tick > now_tick:
+                self.current = max(self.current, now_tick)
+                break
+            self.current = tick
+
+            # move timers of higher level slots that start at this tick down the wheel
+            for level in range(self.levels - 1, 0, -1):
+                shift = SLOT_BITS * level
+                if tick & ((1 << shift) - 1):
+                    continue
+                index = (tick >> shift) & SLOT_MASK
+                if self.occupied[level] >> index & 1:
+                    slot = self.slots[level][index]
+                    self.slots[level][index] = set()
+                    self.occupied[level] &= ~(1 << index)
+                    for timer in slot:
+                        self.insert(timer)
+
+            index = tick & SLOT_MASK
+            if self.occupied[0] >> index & 1:
+                slot = self.slots[0][index]
+                self.slots[0][index] = set()
+                self.occupied[0] &= ~(1 << index)
+                self.due.update(slot)
+                for timer in slot:
+                    timer.level = DUE
+
+        due = sorted(self.due, key=lambda timer: timer.deadline)
+        self.due = set()
+        for timer in due:
+            timer.level = None
+        return due
+
+    def run(self):
+        """driver thread, sleeps until the next tick with work and runs the due callbacks"""
+        while True:
+            with self.cond:
+                if self.closed:
+                    return
+                now_tick = int((time.monotonic() - self.start_time) // self.tick)
+                due = self.advance(now_tick)
+                if not due:
+                    tick = self.next_tick()
+                    timeout = None
+                    if tick is not None:
+                        timeout = max(self.start_time + tick * self.tick - time.monotonic(), 0)
+                    self.cond.wait(timeout)
+
+            for timer in due:
+                try:
+                    timer.callback(*timer.args)
+                except Exception as e:
+                    print('[WARNING] timer callback failed:', e)
@@ -0,0 +1,247 @@
+""" WordPiece tokenizer for the intent model, giving the same ids as the bert-for-tf2
+    FullTokenizer pickled in things/tokenizer.pkl without needing bert-for-tf2.
+    The vocabulary is a byte trie in things/wordpiece.bin (written by
+    tools/export_vocab.py) that is memory mapped instead of parsed, so loading it
+    is instant and only the pages that are walked are read. Words are split the
+    way bert's BasicTokenizer does it and matched greedily, longest piece first,
+    by walking the trie.
+
+    Trie layout: nodes are numbered breadth first with the root at 0, so the
+    children of a node are the consecutive nodes first[node] .. first[node + 1] - 1,
+    sorted by the byte on the edge leading into them (labels[child]). ids[node] is
+    the token id of the piece spelled by the path to the node, -1 if there is none.
+    Continuation pieces ('##ing') are found by walking from the node of '##'.
+
+        header  8 byte magic, then uint32 nodes, id size, unk id, '##' node,
+                max chars per word, lower case (little endian)
+        first   int32 x (nodes + 1)
+        ids     int16 or int32 x nodes
+        labels  uint8 x nodes """
+
+import mmap
+import struct
+import sys
+import unicodedata
+from array import array
+from collections import deque
+import numpy as np
+
+MAGIC = b'WPTRIE1\0'
+HEADER = struct.Struct('<6I')
+
+BYTES = [bytes((b,)) for b in range(256)]
+
+# bert treats every non letter/number ascii character as punctuation
+ASCII_PUNCTUATION = [c for c in range(33, 127) if not chr(c).isalnum()]
+
+# ascii text: control characters are dropped, tab/newline/return become spaces and
+# punctuation is split off, all in one translate
+ASCII_TABLE = {c: None for c in list(range(32)) + [127]}
+ASCII_TABLE.update({ord('\t'): ' ', ord('\n'): ' ', ord('\r'): ' '})
+ASCII_TABLE.update({c: ' ' + chr(c) + ' ' for c in ASCII_PUNCTUATION})
+
+# words that have been split into pieces, cleared when it reaches this size
+CACHE_SIZE = 4096
+
+
+def is_cjk(cp):
+    return (0x4E00 <= cp <= 0x9FFF or 0x3400 <= cp <= 0x4DBF or 0x20000 <= cp <= 0x2A6DF or
+            0x2A700 <= cp <= 0x2B73F or 0x2B740 <= cp <= 0x2B81F or 0x2B820 <= cp <= 0x2CEAF or
+            0xF900 <= cp <= 0xFAFF or 0x2F800 <= cp <= 0x2FA1F)
+
+
+def is_punctuation(char):
+    cp = ord(char)
+    if 33 <= cp <= 47 or 58 <= cp <= 64 or 91 <= cp <= 96 or 123 <= cp <= 126:
+        return True
+    return unicodedata.category(char).startswith('P')
+
+
+def clean(text):
+    """drops invalid and control characters, turns whitespace into spaces and puts
+    spaces around cjk characters"""
+    out = []
+    for char in text:
+        if char in ' \t\n\r':
+            out.append(' ')
+            continue
+        cp = ord(char)
+        cat = unicodedata.category(char)
+        if cp == 0 or cp == 0xFFFD or cat in ('Cc', 'Cf'):
+            continue
+        if cat == 'Zs':
+            out.append(' ')
+        elif is_cjk(cp):
+            out.append(' ' + char + ' ')
+        else:
+            out.append(char)
+    return ''.join(out)
+
+
+def split_words(text, lower=True):
+    """the words bert's BasicTokenizer splits text into"""
+    if text.isascii():
+        text = text.translate(ASCII_TABLE)
+        return (text.lower() if lower else text).split()
+
+    pieces = []
+    for token in clean(text).split():
+        if lower:
+            token = ''.join(c for c in unicodedata.normalize('NFD', token.lower())
+                            if unicodedata.category(c) != 'Mn')
+        word = []
+        for char in token:
+            if is_punctuation(char):
+                pieces.append(''.join(word))
+                pieces.append(char)
+                word = []
+            else:
+                word.append(char)
+        pieces.append(''.join(word))
+    return ' '.join(pieces).split()
+
+
+def write_trie(vocab, path, unk_token='[UNK]', max_chars=200, lower=True):
+    """writes a {token: id} vocabulary as a trie file"""
+    children = [{}]
+    values = [-1]
+    for token, token_id in vocab.items():
+        node = 0
+        for b in token.encode('utf-8'):
+            if b not in children[node]:
+                children[node][b] = len(children)
+                children.append({})
+                values.append(-1)
+            node = children[node][b]
+        values[node] = token_id
+
+    # renumber breadth first so the children of every node are consecutive
+    order = []
+    labels = bytearray([0])
+    queue = deque([0])
+    while queue:
+        node = queue.popleft()
+        order.append(node)
+        for b in sorted(children[node]):
+            labels.append(b)
+            queue.append(children[node][b])
+    number = {node: i for i, node in enumerate(order)}
+
+    first = array('i', [0] * (len(order) + 1))
+    next_child = 1
+    for i, node in enumerate(order):
+        first[i] = next_child
+        next_child += len(children[node])
+    first[len(order)] = next_child
+
+    id_type = 'h' if max(vocab.values()) < 2 ** 15 else 'i'
+    ids = array(id_type, [values[node] for node in order])
+
+    def find(token):
+        node = 0
+        for b in token.encode('utf-8'):
+            node = number[children[order[node]][b]]
+        return node
+
+    if sys.byteorder != 'little':
+        first.byteswap()
+        ids.byteswap()
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(HEADER.pack(len(order), ids.itemsize, vocab[unk_token], find('##'),
+                            max_chars, int(lower)))
+        f.write(first.tobytes())
+        f.write(ids.tobytes())
+        f.write(labels)
+
+
+class WordPieceTokenizer:
+    """Turns text into the token ids of the intent model's vocabulary"""
+
+    def __init__(self, path='things/wordpiece.bin'):
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(MAGIC)] != MAGIC:
+            raise ValueError(path + ' is not a wordpiece trie')
+        (nodes, id_size, self.unk_id, self.continuation, self.max_chars,
+         self.lower) = HEADER.unpack_from(self.map, len(MAGIC))
+
+        offset = len(MAGIC) + HEADER.size
+        self.first = self.view(offset, nodes + 1, 'i')
+        offset += 4 * (nodes + 1)
+        self.ids = self.view(offset, nodes, 'h' if id_size == 2 else 'i')
+        self.labels_start = offset + id_size * nodes
+
+        self.cls_id = self.token_id('[CLS]')
+        self.sep_id = self.token_id('[SEP]')
+        self.cache = {}
+
+    def view(self, offset, count, typecode):
+        """an array of count items at offset in the file, memory mapped if possible"""
+        data = memoryview(self.map)[offset:offset + count * array(typecode).itemsize]
+        if sys.byteorder == 'little':
+            return data.cast(typecode)
+        values = array(typecode)
+        values.frombytes(data)
+        values.byteswap()
+        return values
+
+    def child(self, node, b):
+        """the node below node on the edge labelled with byte b, -1 if there is none"""
+        found = self.map.find(BYTES[b], self.labels_start + self.first[node],
+                              self.labels_start + self.first[node + 1])
+        return found - self.labels_start if found >= 0 else -1
+
+    def token_id(self, token):
+        """the id of a whole token, None if it is not in the vocabulary"""
+        node = 0
+        for b in token.encode('utf-8'):
+            node = self.child(node, b)
+            if node < 0:
+                return None
+        token_id = self.ids[node]
+        return token_id if token_id >= 0 else None
+
+    def word_ids(self, word):
+        """ids of the pieces of one word, [UNK] if it can not be split into pieces"""
+        ids = self.cache.get(word)
+        if ids is not None:
+            return ids
+        if len(self.cache) >= CACHE_SIZE:
+            self.cache.clear()
+
+        # child() inlined, this loop is where tokenizing spends its time
+        first, token_ids, find, labels = self.first, self.ids, self.map.find, self.labels_start
+        ids = []
+        data = word.encode('utf-8')
+        start = 0
+        if len(word) > self.max_chars:
+            start = len(data)
+            ids = [self.unk_id]
+        while start < len(data):
+            # longest piece starting at start, later pieces continue the word ('##')
+            node = 0 if start == 0 else self.continuation
+            end = -1
+            for i in range(start, len(data)):
+                found = find(BYTES[data[i]], labels + first[node], labels + first[node + 1])
+                if found < 0:
+                    break
+                node = found - labels
+                if token_ids[node] >= 0:
+                    end = i + 1
+                    piece = token_ids[node]
+            if end < 0:
+                ids = [self.unk_id]
+                break
+            ids.append(piece)
+            start = end
+
+        self.cache[word] = ids
+        return ids
+
+    def encode(self, text):
+        """token ids of text as an int32 array, without [CLS] and [SEP]"""
+        ids = []
+        for word in split_words(text, self.lower):
+            ids.extend(self.word_ids(word))
+        return np.array(ids, dtype=np.int32)
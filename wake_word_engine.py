@@ -1,119 +1,299 @@
 from datetime import datetime
+from collections import deque
+import math
+import threading
 import numpy as np
-import tensorflow as tf
-import python_speech_features
-import sounddevice as sd
-import pickle
-import librosa
-from numpy.fft import rfft, rfftfreq, irfft
+from audio_bus import AudioBus, supports_rate
+from utils.features import MfccFrontend, StreamingMfcc
+from utils.dsp import Decimator, HighPassFilter, VoiceActivityGate
+from utils.decision import WakeWordDecision
+from utils.inference import load_interpreter
 
 class WakeWordEngine:
     """ Willow's wake word engine, uses a tensorflow lite model to determine 
         whether audio contains the word willow"""
         
-    def __init__(self):
-        """Executed immediately after class is initialized"""
+    def __init__(self, window_stride=0.5, bus=None, capture_at_resample_rate=False):
+        """Executed immediately after class is initialized
+
+            window_stride is the hop in seconds between two evaluations of the 1 second
+            window. Multiples of the 50 ms mfcc frame step (e.g. 0.1, 0.25, 0.5) let the
+            mfccs of the overlapping part of the window be reused.
+            bus is the AudioBus to listen on, the engine opens its own if none is given.
+            capture_at_resample_rate opens that bus straight at resample_rate when the
+            device supports it, so nothing has to be decimated. A given bus is used at
+            whatever rate it has, the decimator is skipped when that is resample_rate."""
         # Parameters
         self.word_threshold = 0.50
-        self.rec_duration = 0.5
-        self.window_stride = 0.5
+        self.window_duration = 1.0
+        self.window_stride = window_stride
+        self.rec_duration = window_stride
         self.samplerate = 16000
         self.resample_rate = 8000
         self.num_channels = 1
+        self.capture_at_resample_rate = capture_at_resample_rate
         self.num_mfcc = 16
         self.model_path = 'models/wake_word_model_3.tflite'
-        self.listen = False
+        self.print_scores = True
+
+        # set by the inference worker once willow is heard, stream_until_willow blocks on it
+        self.detected = threading.Event()
+        # set by interrupt() when something else needs the main loop, e.g. a timer went off
+        self.interrupted = False
+
+        # The inference worker reads recordings from its own subscription to the audio bus.
+        # When it falls more than max_queued_blocks recordings behind, the oldest ones are
+        # dropped instead of holding up the audio thread
+        self.max_queued_blocks = 4
+        self.subscription = None
+        self.dropped_blocks = 0
+        self.max_queue_depth = 0
         
-        # Sliding window
-        self.window = np.zeros(int(self.rec_duration * self.resample_rate) * 2)
+        # Command capture. The raw audio of the last pre_roll seconds is kept, and once willow
+        # is detected the stream keeps recording until the user stops talking, so the command
+        # can be transcribed without reopening the microphone
+        self.capture_command = True
+        self.pre_roll = 1.0
+        self.end_silence = 1.0
+        self.command_timeout = 5.0
+        self.max_command_duration = 10.0
+        self.pre_roll_blocks = deque(maxlen=math.ceil(self.pre_roll / self.rec_duration))
+        self.command = []
+        self.recording_command = False
+        self.command_done = threading.Event()
+        self.command_audio = None
+
+        # Capture rate, audio captured at any rate other than resample_rate is decimated
+        if bus is None:
+            rate = self.samplerate
+            if self.capture_at_resample_rate and supports_rate(self.resample_rate, self.num_channels):
+                rate = self.resample_rate
+            bus = AudioBus(rate, self.num_channels)
+        self.bus = bus
+        self.capture_rate = bus.rate
+        self.blocksize = int(self.capture_rate * self.rec_duration)
+        self.decimator = None
+        if self.capture_rate != self.resample_rate:
+            self.decimator = Decimator(self.capture_rate, self.resample_rate)
+
+        # Removes everything below 200 Hz, one recording at a time
+        self.high_pass = HighPassFilter(self.resample_rate)
+
+        # Sliding window, moves forward by hop samples on every recording
+        self.hop = int(self.window_stride * self.resample_rate)
+        self.window = np.zeros(int(self.window_duration * self.resample_rate))
+
+        # Mfcc frontend (filterbank, window and dct are built once here) and a
+        # streaming extractor on top of it that only computes frames for new audio
+        self.frontend = MfccFrontend(self.resample_rate, self.num_mfcc)
+        self.features = StreamingMfcc(self.frontend, len(self.window), self.hop)
 
-        # Load model (using tf lite interpreter)
-        self.interpreter = tf.lite.Interpreter(self.model_path)
-        self.interpreter.allocate_tensors()
+        # Voice activity gate, windows without speech skip feature extraction and inference.
+        # Speech keeps the gate open until it has slid out of the window
+        self.use_voice_gate = True
+        self.voice_gate = VoiceActivityGate(self.resample_rate, len(self.window) // self.hop - 1)
+        self.windows_processed = 0
+        self.windows_skipped = 0
+
+        # Decision layer over the window scores (smoothing, n of m voting, refractory period)
+        self.decision = WakeWordDecision(self.word_threshold)
+
+        # Load model (tflite_runtime or tf lite interpreter, with the tuned options)
+        self.interpreter = load_interpreter(self.model_path)
         self.input_details = self.interpreter.get_input_details()
         self.output_details = self.interpreter.get_output_details()
+        # views of the model's input and output buffers, see predict_willow
+        self.input_tensor = self.interpreter.tensor(self.input_details[0]['index'])
+        self.output_tensor = self.interpreter.tensor(self.output_details[0]['index'])
 
-    def stream_until_willow(self):
-        """Pauses program until the word willow is detected from the user or an alarm is going off"""
+    def stream_until_willow(self, next_alarm=None):
+        """Pauses program until the word willow is detected from the user or the alarm due at
+            next_alarm (a datetime, None if no alarm is set) is going off.
+            If capture_command is on, the command said after willow is left in command_audio
+            as 16 bit samples at capture_rate"""
 
-        #load alarm list
-        with open('things/alarms.pkl', 'rb') as f:
-            als : list = pickle.load(f)
-        al_list_is_empty = len(als) == 0
         alarm_going_off = False
+        self.command_audio = None
 
         print()
         print('Say Willow...')
 
-        #audio stream to detect willow        
-        with sd.InputStream(channels=self.num_channels,
-                        samplerate=self.samplerate,
-                        blocksize=int(self.samplerate * self.rec_duration),
-                        callback=self.sd_callback):
-            while not self.listen and not alarm_going_off:
-                if not al_list_is_empty:
-                    alarm_going_off = als[0][0] <= datetime.now()
+        # audio stream to detect willow, inference runs on its own thread reading from the bus
+        self.bus.start()
+        self.subscription = self.bus.subscribe(max_lag=self.max_queued_blocks * self.blocksize)
+        worker = threading.Thread(target=self.inference_worker, args=(self.subscription,), daemon=True)
+        worker.start()
+
+        # sleep until the worker signals a detection, the earliest alarm is due or something
+        # interrupts the engine
+        timeout = None
+        if next_alarm is not None:
+            timeout = max((next_alarm - datetime.now()).total_seconds(), 0)
+        if self.interrupted:
+            self.detected.set()
+        alarm_going_off = not self.detected.wait(timeout) or self.interrupted
+        self.interrupted = False
+
+        # keep listening while the command is being said
+        if not alarm_going_off and self.recording_command:
+            print('speak: ')
+            self.command_done.wait(self.max_command_duration)
+
+        # stop the worker, audio that is still unread is stale by now
+        self.subscription.close()
+        worker.join()
+        self.dropped_blocks += self.subscription.dropped // self.blocksize
+        self.subscription = None
+        if self.recording_command:
+            self.finish_command()
 
         if alarm_going_off:
             print('ALARM GOING OFF brrrrrrrrrrr')
-        self.listen = False
-        self.window = np.zeros(int(self.rec_duration * self.resample_rate) * 2)
-
-    def jankiest(self, audio):
-        """audio transformation to remove white noise"""
-        n = len(audio)
-        yf = rfft(audio)
-        xf = rfftfreq(n, 1/n)
-        indices = xf > 200
-        yf_clean = indices * yf
-        return irfft(yf_clean)
-
-    def predict_willow(self, raw_audio, rate):
-        """use wake_word_model to guess whether given audio clip contains the word willow"""
-        mfccs = python_speech_features.base.mfcc(raw_audio, 
-                                            samplerate=rate,
-                                            winlen=0.256,
-                                            winstep=0.050,
-                                            numcep=self.num_mfcc,
-                                            nfilt=26,
-                                            nfft=2048,
-                                            preemph=0.0,
-                                            ceplifter=0,
-                                            appendEnergy=False,
-                                            winfunc=np.hanning)
-        mfccs = mfccs.transpose()
-
-        # Make prediction from model
-        in_tensor = np.float32(mfccs.reshape(1, mfccs.shape[0], mfccs.shape[1], 1))
-        self.interpreter.set_tensor(self.input_details[0]['index'], in_tensor)
+        self.reset()
+
+    def listen_for_command(self):
+        """Records a command without waiting for willow, e.g. when stream_until_willow
+            returned early and the user is asked to speak. The command is captured the
+            same way as after a detection and left in command_audio"""
+        self.command_audio = None
+        self.bus.start()
+        subscription = self.bus.subscribe()
+        self.start_command()
+        # nothing said before this call belongs to the command
+        self.command = []
+        print('speak: ')
+        while self.recording_command:
+            self.record_command(subscription.read(self.blocksize))
+        subscription.close()
+        self.reset()
+
+    def interrupt(self):
+        """makes stream_until_willow return as if an alarm went off, safe to call from any thread"""
+        self.interrupted = True
+        self.detected.set()
+
+    def reset(self, keep_refractory=True):
+        """clears the detection and all audio state so the next recording starts a new stream.
+            The decision layer's refractory period is kept unless keep_refractory is False,
+            e.g. between unrelated recordings"""
+        self.detected.clear()
+        self.window[:] = 0
+        self.high_pass.reset()
+        self.features.reset()
+        self.voice_gate.reset()
+        self.decision.reset(keep_refractory)
+        if self.decimator:
+            self.decimator.reset()
+        self.pre_roll_blocks.clear()
+        self.command = []
+        self.recording_command = False
+        self.command_done.clear()
+
+    def start_command(self):
+        """starts recording the command, beginning with the pre-roll audio"""
+        self.command = list(self.pre_roll_blocks)
+        self.command_heard = False
+        self.command_silence = 0
+        self.command_length = 0
+        self.recording_command = True
+
+    def record_command(self, rec):
+        """adds a recording to the command, finishes it once the user has stopped talking"""
+        self.command.append(rec)
+        self.command_length += self.rec_duration
+
+        if self.decimator:
+            rec = self.decimator.process(rec)
+        if self.voice_gate.is_speech(rec):
+            self.command_heard = True
+            self.command_silence = 0
+        else:
+            self.command_silence += self.rec_duration
+
+        if (self.command_heard and self.command_silence >= self.end_silence) or \
+                (not self.command_heard and self.command_length >= self.command_timeout) or \
+                self.command_length >= self.max_command_duration:
+            self.finish_command()
+
+    def finish_command(self):
+        """converts the recorded command to 16 bit samples in command_audio"""
+        audio = np.concatenate(self.command) if self.command else np.zeros(0)
+        self.command_audio = (np.clip(audio, -1, 1) * 32767).astype(np.int16)
+        self.command = []
+        self.recording_command = False
+        self.command_done.set()
+
+    def predict_willow(self, mfccs):
+        """use wake_word_model to guess whether the (num_mfcc, frames) mfccs of an audio clip 
+            contain the word willow"""
+        # Make prediction from model. The mfccs are transposed and converted to float32 as
+        # they are copied into the input buffer, and the score is read straight from the
+        # output buffer. The views are dropped before invoke, which refuses to run while
+        # one is alive
+        self.input_tensor()[0, :, :, 0] = mfccs
         self.interpreter.invoke()
-        output_data = self.interpreter.get_tensor(self.output_details[0]['index'])
-        return output_data[0][0]
+        return self.output_tensor()[0][0]
     
-    # This gets called every 0.5 seconds
-    def sd_callback(self, rec, frames, time, status):
-        """Callback method for the input stream"""
+    @property
+    def queue_depth(self):
+        """number of recordings waiting for the inference worker"""
+        if self.subscription is None:
+            return 0
+        return self.subscription.available // self.blocksize
 
-        # Notify if errors
-        if status:
-            print('Error:', status)
+    def inference_worker(self, subscription):
+        """Runs every recording from the subscription through the detector until it is closed"""
+        while True:
+            rec = subscription.read(self.blocksize)
+            if rec is None:
+                return
+            self.max_queue_depth = max(self.max_queue_depth, subscription.available // self.blocksize)
+            self.process_recording(rec)
 
-        # Remove 2nd dimension from recording sample
-        rec = np.squeeze(rec)
+    def add_recording(self, rec):
+        """Resamples and filters a recording, slides it into the window and returns it"""
 
-        # Resample
-        rec = librosa.resample(rec, orig_sr=self.samplerate, target_sr=self.resample_rate, res_type="linear")
-        
-        # Save recording onto sliding window
-        self.window[:len(self.window)//2] = self.window[len(self.window)//2:]
-        self.window[len(self.window)//2:] = rec
+        # Resample (carries filter state over from the last recording)
+        if self.decimator:
+            rec = self.decimator.process(rec)
+
+        # Remove low frequency noise, the filter state carries over between recordings
+        rec = self.high_pass.process(rec)
         
-        # Perform audio transformation
-        thing = self.jankiest(self.window)
+        # Save filtered recording onto sliding window
+        self.window[:-self.hop] = self.window[self.hop:]
+        self.window[-self.hop:] = rec
+        return rec
+
+    def process_recording(self, rec):
+        """Adds one recording to the sliding window and checks the window for willow"""
 
-        val = self.predict_willow(thing, self.resample_rate)
+        # After a detection recordings belong to the command
+        if self.recording_command:
+            self.record_command(rec)
+            return
+        if self.capture_command:
+            self.pre_roll_blocks.append(rec)
+
+        rec = self.add_recording(rec)
+
+        # Nothing but silence in the window, no need to run the model
+        if self.use_voice_gate and not self.voice_gate.update(rec):
+            self.windows_skipped += 1
+            # the cached mfcc frames no longer line up with the window
+            self.features.reset()
+            self.decision.update(0.0)
+            return
+        self.windows_processed += 1
+        
+        # Only the frames covering the new recording are computed
+        mfccs = self.features.update(self.window)
 
-        if val > self.word_threshold:
-            self.listen = True
-        print(val)
+        val = self.predict_willow(mfccs)
 
+        if self.decision.update(val):
+            if self.capture_command:
+                self.start_command()
+            self.detected.set()
+        if self.print_scores:
+            print(val)
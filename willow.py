@@ -1,33 +1,167 @@
-""" This script keeps the natural language processing model loaded 
-    so that any file can use it. Contains a method to predict an intent
-    using a user utterance"""
+""" This script gives any file access to the natural language processing model
+    through the shared model registry, which loads it on first use (or when
+    warmed up) and can unload it again after an idle period. Contains a method to
+    predict an intent using a user utterance"""
 
-import tensorflow as tf
-import pickle
 import numpy as np
+from utils.inference import load_config, load_interpreter
+from utils.models import registry
+from utils.wordpiece import WordPieceTokenizer
 
-with open('things/tokenizer.pkl','rb') as file:
-    tokenizer = pickle.load(file)
+model_path = "models/model.tflite"
+
+# Input lengths the model is run at. An utterance is padded to the shortest length that
+# fits it and cut off at the longest. The model was trained at 30 tokens and takes no
+# attention mask, so padding to any other length changes its output. Shorter buckets
+# such as [8, 16, 32, 64] run short commands faster, but set them with 'buckets' for
+# models/model.tflite in things/inference_config.json only after
+# tools/evaluate_intents.py --buckets shows no accuracy loss on your corpus
+buckets = [30]
+
+
+class IntentBucket:
+    """an interpreter of the intent model with its input resized to (rows, length), a
+    length of None keeps the shape the model was converted with"""
+
+    def __init__(self, length=None, rows=1):
+        input_shape = None if length is None else [rows, length]
+        self.interpreter = load_interpreter(model_path, input_shape=input_shape)
+        input_details = self.interpreter.get_input_details()
+        self.rows = int(input_details[0]['shape'][0])
+        self.length = int(input_details[0]['shape'][1])
+
+        # views of the interpreter's own input and output buffers. A view must not be
+        # held across invoke(), so these return a fresh one on every call
+        self.input = self.interpreter.tensor(input_details[0]['index'])
+        self.output = self.interpreter.tensor(self.interpreter.get_output_details()[0]['index'])
+
+
+class IntentModel:
+    """the tokenizer and the interpreters of the intent model. Every bucket is a full
+    interpreter with its own copy of the packed weights, so only the longest bucket
+    is loaded up front and the others the first time an utterance needs them"""
+
+    def __init__(self, lengths=None):
+        self.tokenizer = WordPieceTokenizer()
+
+        if lengths is None:
+            lengths = load_config().get(model_path, {}).get('buckets', buckets)
+        self.lengths = sorted(lengths)
+        self.buckets = {}       # length -> IntentBucket
+        self.fixed = None       # the model at its converted shape, if it can not be resized
+        # interpreters for classify, made when they are first needed
+        self.batches = {}
+        self.bucket(self.lengths[-1])
+
+    def size(self, length):
+        """the input length an utterance of length tokens is run at"""
+        if not self.lengths:
+            return self.bucket(length).length
+        for size in self.lengths:
+            if size >= length:
+                return size
+        return self.lengths[-1]
+
+    def bucket(self, length):
+        """the interpreter an utterance of length tokens is run on, loaded the first
+        time it is needed"""
+        while self.lengths:
+            size = self.size(length)
+            if size in self.buckets:
+                return self.buckets[size]
+            try:
+                self.buckets[size] = IntentBucket(size)
+                return self.buckets[size]
+            except (RuntimeError, ValueError) as e:
+                print('[WARNING] intent model can not run at', size, 'tokens:', e)
+                self.lengths.remove(size)
+        if self.fixed is None:
+            self.fixed = IntentBucket()
+        return self.fixed
+
+    def batch(self, rows, length):
+        """an interpreter that runs (at least) rows utterances of the bucket length at
+        once, the bucket itself if the model can not be run on batches"""
+        made = [batch for (size, batch_length), batch in self.batches.items()
+                if batch_length == length and size >= rows]
+        if made:
+            return min(made, key=lambda batch: batch.rows)
+        try:
+            self.batches[rows, length] = IntentBucket(length, rows)
+        except (RuntimeError, ValueError) as e:
+            print('[WARNING] intent model can not run', rows, 'utterances at once:', e)
+            self.batches[rows, length] = self.bucket(length)
+        return self.batches[rows, length]
+
+
+# seconds without a request after which the model is unloaded, set 'idle_unload' for
+# models/model.tflite in things/inference_config.json to turn it on
+registry.register('intent', IntentModel, load_config().get(model_path, {}).get('idle_unload'))
+
+
+def warm_up():
+    """starts loading the model in the background"""
+    registry.warm_up('intent')
+
+def fill(out, tokenizer, token_ids):
+    """writes [CLS] token_ids [SEP] into the (1, length) out and pads them with 0. Ids
+    that do not fit are cut off, [SEP] is always kept"""
+    n = min(len(token_ids), out.shape[1] - 2)
+    out[0, 0] = tokenizer.cls_id
+    out[0, 1:n + 1] = token_ids[:n]
+    out[0, n + 1] = tokenizer.sep_id
+    out[0, n + 2:] = 0
+    return out
+
+def encode(utr, model=None, length=30):
+    """token ids of an utterance in the (1, length) form the model takes"""
+    tokenizer = (model or registry.get('intent')).tokenizer
+    return fill(np.zeros((1, length), dtype=np.int32), tokenizer, tokenizer.encode(utr))
 
-interpreter = tf.lite.Interpreter(model_path="models/model.tflite")
-interpreter.allocate_tensors()
-input_details = interpreter.get_input_details()
-output_details = interpreter.get_output_details()
- 
 def find_intent(utr):
-    tokens = ["[CLS]"] + tokenizer.tokenize(utr) + ["[SEP]"]
+    model = registry.get('intent')
+    token_ids = model.tokenizer.encode(utr)
+    bucket = model.bucket(len(token_ids) + 2)
+
+    # the ids go straight into the input tensor and the output is read in place
+    fill(bucket.input(), model.tokenizer, token_ids)
+    bucket.interpreter.invoke()
+
+    output_data = bucket.output()[0]
+    index = int(output_data.argmax())
+    return (index, output_data[index])
 
-    token_ids = []
-    token_ids.append(list(tokenizer.convert_tokens_to_ids(tokens)))
-    token_ids[0] += [0]*(30-len(token_ids[0]))
-    token_ids = np.array(list(token_ids), dtype=np.int32)
+def classify(utterances, batch_size=32, model=None):
+    """intent indices and probabilities of many utterances, the same as find_intent gives
+    for each of them. Utterances are grouped by the bucket find_intent would run them
+    at (the model has no attention mask, so the padding changes its output a little)
+    and every invoke classifies up to batch_size of a group. model defaults to the
+    shared one"""
+    model = model or registry.get('intent')
+    encoded = [model.tokenizer.encode(utr) for utr in utterances]
+    indices = np.zeros(len(encoded), dtype=np.int64)
+    probabilities = np.zeros(len(encoded), dtype=np.float32)
 
-    interpreter.set_tensor(input_details[0]['index'], token_ids)
-    interpreter.invoke()
-    output_data = interpreter.get_tensor(output_details[0]['index'])
+    groups = {}
+    for i, token_ids in enumerate(encoded):
+        groups.setdefault(model.size(len(token_ids) + 2), []).append(i)
 
-    highest_probability = np.amax(output_data)
-    index = np.where(output_data == highest_probability)[1][0]
+    for length, members in groups.items():
+        batch = model.batch(min(batch_size, len(members)), length)
+        for start in range(0, len(members), batch.rows):
+            chunk = members[start:start + batch.rows]
+            input_data = batch.input()
+            for row, i in enumerate(chunk):
+                fill(input_data[row:row + 1], model.tokenizer, encoded[i])
+            # rows after the last utterance of a group are left over from the chunk before
+            input_data[len(chunk):] = 0
+            del input_data
+            batch.interpreter.invoke()
 
-    return (index, highest_probability)
+            output_data = batch.output()[:len(chunk)]
+            best = output_data.argmax(axis=1)
+            indices[chunk] = best
+            probabilities[chunk] = output_data[np.arange(len(chunk)), best]
+            del output_data
 
+    return indices, probabilities